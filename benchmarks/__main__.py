@@ -0,0 +1,40 @@
+'''
+Run the offline benchmark suite, each benchmark in its own process so peak memory is measured per
+benchmark. Results are written to benchmarks/results as usual.
+
+    python -m benchmarks [--quick]
+'''
+import argparse
+import subprocess
+import sys
+
+SUITE = {
+    'search': ['benchmarks.search'],
+    'audit_pipeline': ['benchmarks.audit_pipeline', '--synthetic', '200'],
+    'db_load': ['benchmarks.db_load'],
+    'load_test': ['benchmarks.load_test']
+}
+QUICK = {
+    'search': ['--limit', '20', '--depts', '1'],
+    'audit_pipeline': ['--repeat', '1'],
+    'db_load': ['--users', '100', '--duration', '3'],
+    'load_test': ['--uploads', '50', '--concurrency', '4']
+}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quick', action='store_true', help='smaller runs for a smoke test')
+    parser.add_argument('benchmarks', nargs='*', default=list(SUITE), choices=list(SUITE))
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.benchmarks:
+        print(f'== {name}')
+        command = [sys.executable, '-m', *SUITE[name], *(QUICK[name] if args.quick else [])]
+        if subprocess.run(command).returncode != 0:
+            failed.append(name)
+    if failed:
+        sys.exit(f"Failed: {', '.join(failed)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+'''
+Check that the audit parser engines agree, and time them, over a corpus of saved audits.
+
+    python -m benchmarks.audit_parser [corpus_dir] [--repeat 5] [--synthetic 200]
+
+Every .html file in the corpus (data/failed_audits by default) is parsed by each engine; with
+--synthetic, that many generated audits (see benchmarks.synthetic) are parsed instead. An engine
+whose result or exception differs from the bs4 reference on any file is reported as a mismatch
+and the command exits non-zero. tests/test_audit.py checks the same agreement in the test suite.
+'''
+import argparse
+import glob
+import sys
+import time
+
+from src.audit import AUDIT_PARSERS
+from .common import summarize, save_results
+from .synthetic import synthetic_corpus
+
+def outcome(parser, html):
+    try:
+        return parser(html)
+    except Exception as e:
+        return type(e).__name__
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', nargs='?', default='data/failed_audits')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--synthetic', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = {f'synthetic/{i}': html for i, html in enumerate(synthetic_corpus(args.synthetic, args.seed))}
+        args.corpus = f'synthetic:{args.synthetic}:{args.seed}'
+    else:
+        files = sorted(glob.glob(f'{args.corpus}/*.html'))
+        if not files:
+            sys.exit(f'No audits found in {args.corpus}')
+        corpus = {}
+        for file in files:
+            with open(file) as f:
+                corpus[file] = f.read()
+
+    reference = {file: outcome(AUDIT_PARSERS['bs4'], html) for file, html in corpus.items()}
+    results = {'corpus': args.corpus, 'files': len(corpus), 'engines': {}}
+    mismatched = False
+    for name, engine in AUDIT_PARSERS.items():
+        mismatches = [file for file, html in corpus.items() if outcome(engine, html) != reference[file]]
+        latencies = []
+        for _ in range(args.repeat):
+            for html in corpus.values():
+                start = time.perf_counter()
+                outcome(engine, html)
+                latencies.append(time.perf_counter() - start)
+        results['engines'][name] = {'mismatches': mismatches, 'latency': summarize(latencies)}
+        mismatched |= bool(mismatches)
+        latency = results['engines'][name]['latency']
+        print(f"{name:5} p50={latency['p50_ms']:.2f}ms p99={latency['p99_ms']:.2f}ms "
+              f"mismatches={len(mismatches)}")
+        for file in mismatches:
+            print(f'    {file}')
+    save_results('audit_parser', results)
+    sys.exit(1 if mismatched else 0)
+
+if __name__ == '__main__':
+    main()
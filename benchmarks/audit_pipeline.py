@@ -0,0 +1,88 @@
+'''
+Time the audit upload pipeline end to end: parsing alone, sanitising plus parsing, and the whole
+/degree_audit_post request through Flask's test client against a scratch database.
+
+    python -m benchmarks.audit_pipeline [corpus_dir] [--repeat 5] [--synthetic 200]
+
+--synthetic replaces the corpus with that many generated audits (see benchmarks.synthetic), so the
+benchmark runs without real audits.
+
+The bs4 parser runs the old bleach + regex + html.parser pipeline, which tokenises each audit
+twice; the lxml parser sanitises and extracts in a single parse.
+'''
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+from src import db
+from src.audit import AUDIT_PARSERS, process_audit, process_upload
+from .common import summarize, throughput, peak_memory, save_results
+from .synthetic import synthetic_corpus
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus', nargs='?', default='data/failed_audits')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--synthetic', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = synthetic_corpus(args.synthetic, args.seed)
+        args.corpus = f'synthetic:{args.synthetic}:{args.seed}'
+    else:
+        files = sorted(glob.glob(f'{args.corpus}/*.html'))
+        if not files:
+            sys.exit(f'No audits found in {args.corpus}')
+        corpus = []
+        for file in files:
+            with open(file) as f:
+                corpus.append(f.read())
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    db.init_db()
+    for i, html in enumerate(corpus):
+        audit, _ = process_upload(html, 'bs4')
+        if isinstance(audit, dict):
+            db.link_pid(f'benchmark-{i}', audit['pid'])
+
+    from server import app
+    client = app.test_client()
+    results = {'corpus': args.corpus, 'files': len(corpus), 'parsers': {}}
+    for name in AUDIT_PARSERS:
+        parse, pipeline, requests = [], [], []
+        app.config['AUDIT_PARSER'] = name
+        for repeat in range(args.repeat):
+            for html in corpus:
+                start = time.perf_counter()
+                process_audit(html, name)
+                parse.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                process_upload(html, name)
+                pipeline.append(time.perf_counter() - start)
+
+                # a unique comment defeats the repeat-upload shortcut, so every request is parsed
+                upload = f'{html}<!-- {name} {repeat} -->'
+                start = time.perf_counter()
+                client.post('/degree_audit_post', json={'html': upload})
+                requests.append(time.perf_counter() - start)
+        results['parsers'][name] = {
+            'parse': summarize(parse),
+            'pipeline': summarize(pipeline),
+            'pipeline_per_s': throughput(len(pipeline), sum(pipeline)),
+            'request': summarize(requests),
+            'request_per_s': throughput(len(requests), sum(requests))
+        }
+        print(f"{name:5} pipeline p50={results['parsers'][name]['pipeline']['p50_ms']:.2f}ms "
+              f"request p50={results['parsers'][name]['request']['p50_ms']:.2f}ms "
+              f"p99={results['parsers'][name]['request']['p99_ms']:.2f}ms "
+              f"{results['parsers'][name]['request_per_s']:.0f} req/s")
+    results['memory'] = peak_memory()
+    save_results('audit_pipeline', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+from datetime import datetime
+import json
+import os
+import resource
+import sys
+
+import numpy as np
+
+RESULTS_DIR = 'benchmarks/results'
+
+def summarize(latencies: list) -> dict:
+    '''
+    Latency percentiles in milliseconds for a list of durations in seconds.
+    '''
+    ms = np.asarray(latencies) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max())
+    }
+
+def throughput(count: int, seconds: float) -> float:
+    return count / seconds if seconds > 0 else 0.0
+
+def peak_memory() -> dict:
+    '''
+    Peak resident memory of this process and its finished children so far, in megabytes.
+    '''
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        'children_peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    }
+
+def save_results(name: str, results: dict) -> str:
+    '''
+    Store benchmark results as JSON under benchmarks/results so runs can be compared.
+    '''
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = f"{RESULTS_DIR}/{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results written to {path}')
+    return path
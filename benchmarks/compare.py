@@ -0,0 +1,48 @@
+'''
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare old.json new.json [--threshold 0.1] [--metrics p50_ms p99_ms]
+
+Latencies (*_ms) regress when they grow and throughputs (*_per_s) when they shrink by more than the
+threshold. Exits non-zero if any metric regressed.
+'''
+import argparse
+import json
+import sys
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    values = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[f'{prefix}{key}'] = value
+    return values
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    parser.add_argument('--metrics', nargs='+', default=['p50_ms', 'p95_ms', 'p99_ms', 'per_s'])
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = flatten(json.load(f))
+    with open(args.new) as f:
+        new = flatten(json.load(f))
+
+    regressions = 0
+    for path in sorted(old.keys() & new.keys()):
+        metric = path.rsplit('.', 1)[-1]
+        if not any(metric.endswith(name) for name in args.metrics) or old[path] == 0:
+            continue
+        change = (new[path] - old[path]) / old[path]
+        worse = change > args.threshold if metric.endswith('_ms') else change < -args.threshold
+        regressions += worse
+        print(f"{'REGRESSED' if worse else '':9} {path:60} {old[path]:12.3f} -> {new[path]:12.3f} ({change:+.1%})")
+    print(f'{regressions} regressions over {args.threshold:.0%}')
+    sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
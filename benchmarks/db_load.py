@@ -0,0 +1,112 @@
+'''
+Load test the database layer with concurrent readers and writers on a scratch database, seeded
+with synthetic audits.
+
+    python -m benchmarks.db_load [--users 500] [--readers 8] [--writers 2] [--duration 10]
+
+Writers store audits for random users, half of them unchanged so that the short unchanged-audit
+path is exercised too. Readers mix the bot's queries: rebuilding an audit for /me, course
+progress for /next, verification checks and upload hash lookups. Every operation's latency is
+recorded, along with the number of operations that failed on a locked database.
+'''
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from src import db
+from src.audit import audit_hash, process_upload
+from .common import summarize, throughput, peak_memory, save_results
+from .synthetic import synthetic_corpus
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(), 'users.db')
+    db.init_db()
+    corpus = synthetic_corpus(args.users, args.seed)
+    audits = [(process_upload(html, 'lxml')[0], audit_hash(html)) for html in corpus]
+    for i, (audit, upload_hash) in enumerate(audits):
+        db.link_pid(str(i), audit['pid'])
+        db.insert_or_update_user(audit['pid'], audit, upload_hash)
+    # a second version of every audit for writers to swap in
+    changed = [
+        (process_upload(html, 'lxml')[0], audit_hash(html))
+        for html in synthetic_corpus(args.users, args.seed + 1)
+    ]
+
+    stop = threading.Event()
+    latencies, locked, lock = {}, {}, threading.Lock()
+
+    def record(name, func, *func_args):
+        start = time.perf_counter()
+        try:
+            func(*func_args)
+        except sqlite3.OperationalError:
+            with lock:
+                locked[name] = locked.get(name, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.setdefault(name, []).append(elapsed)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            i = rng.randrange(args.users)
+            audit, upload_hash = (changed if rng.random() < 0.5 else audits)[i]
+            # the synthetic PIDs are the same in both corpora
+            record('insert_or_update_user', db.insert_or_update_user, audits[i][0]['pid'], audit, upload_hash)
+        db.close()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        operations = [
+            ('get_audit', lambda: db.get_audit_with_version(str(rng.randrange(args.users)))),
+            ('get_course_progress', lambda: db.get_course_progress([str(rng.randrange(args.users))])),
+            ('get_verified_users', lambda: db.get_verified_users([str(rng.randrange(args.users)) for _ in range(20)])),
+            ('find_audit', lambda: db.find_audit(audits[rng.randrange(args.users)][1]))
+        ]
+        while not stop.is_set():
+            name, operation = rng.choice(operations)
+            record(name, operation)
+        db.close()
+
+    threads = [threading.Thread(target=writer, args=(args.seed + i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(args.seed + 1000 + i,)) for i in range(args.readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        'users': args.users, 'readers': args.readers, 'writers': args.writers, 'duration_s': elapsed,
+        'total_per_s': throughput(sum(map(len, latencies.values())), elapsed), 'operations': {}
+    }
+    for name, values in sorted(latencies.items()):
+        results['operations'][name] = {
+            'latency': summarize(values),
+            'per_s': throughput(len(values), elapsed),
+            'locked': locked.get(name, 0)
+        }
+        print(f"{name:22} {len(values) / elapsed:8.0f}/s p50={summarize(values)['p50_ms']:.2f}ms "
+              f"p95={summarize(values)['p95_ms']:.2f}ms p99={summarize(values)['p99_ms']:.2f}ms "
+              f"locked={locked.get(name, 0)}")
+    results['memory'] = peak_memory()
+    save_results('db_load', results)
+
+if __name__ == '__main__':
+    main()
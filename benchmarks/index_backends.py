@@ -0,0 +1,70 @@
+'''
+Compare the index backends against exact flat L2 search on the stored catalog embeddings.
+
+    python -m benchmarks.index_backends [--queries 500] [--k 10] [--scale 1]
+
+Queries are sampled catalog descriptions with a little noise added, so the benchmark runs without
+the model. --scale replicates the catalog with noise to approximate larger, multi-campus catalogs.
+'''
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from src.courses.embed import load_embeddings
+from src.courses.index import INDEX_BACKENDS, build_index, prepare_queries, search_params
+from .common import summarize, save_results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    base = np.stack(list(load_embeddings().values())).astype(np.float32)
+    vectors = np.concatenate([
+        base + (rng.normal(scale=0.01, size=base.shape).astype(np.float32) if i else 0)
+        for i in range(args.scale)
+    ])
+    ids = np.arange(len(vectors))
+    queries = vectors[rng.choice(len(vectors), size=args.queries)]
+    queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+
+    results = {'catalog_size': len(vectors), 'dim': vectors.shape[1], 'k': args.k, 'backends': {}}
+    truth = None
+    for backend in INDEX_BACKENDS:
+        start = time.perf_counter()
+        index, meta = build_index(vectors, ids, backend)
+        build_time = time.perf_counter() - start
+
+        prepared = prepare_queries(queries, meta)
+        params = search_params(meta)
+        latencies = []
+        found = []
+        for query in prepared:
+            start = time.perf_counter()
+            _, I = index.search(query[None], k=args.k, params=params)
+            latencies.append(time.perf_counter() - start)
+            found.append(I[0])
+        if truth is None:
+            # the first backend is exact flat L2, which is the baseline for recall
+            truth = found
+        recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+
+        results['backends'][backend] = {
+            'params': meta['params'],
+            'build_s': build_time,
+            'size_bytes': int(faiss.serialize_index(index).size),
+            f'recall@{args.k}': float(recall),
+            'latency': summarize(latencies)
+        }
+        print(f"{backend:8} recall@{args.k}={recall:.3f} p50={results['backends'][backend]['latency']['p50_ms']:.3f}ms "
+              f"p99={results['backends'][backend]['latency']['p99_ms']:.3f}ms build={build_time:.2f}s")
+    save_results('index_backends', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+'''
+Load test the audit server over HTTP with concurrent uploads, comparing Flask's development server
+with the production gunicorn setup (gunicorn.conf.py), each against its own scratch database.
+
+    python -m benchmarks.load_test [--servers dev gunicorn] [--uploads 400] [--concurrency 16] [--gzip]
+
+Every upload is a distinct synthetic audit (see benchmarks.synthetic), so none takes the repeat
+upload shortcut. Each client thread keeps one connection open for all of its uploads, as a browser
+would. Throughput, latency percentiles, response statuses and the time the server takes to shut
+down on SIGTERM are recorded per server.
+'''
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from .common import summarize, throughput, save_results
+from .synthetic import synthetic_corpus
+
+def server_command(name: str, port: int, workers: int | None) -> list:
+    if name == 'dev':
+        # what `python server.py` runs, minus the fixed port
+        return [sys.executable, '-c', f"from server import app; app.run(host='127.0.0.1', port={port})"]
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}']
+    if workers:
+        command += ['--workers', str(workers)]
+    return command + ['server:app']
+
+def wait_until_up(port: int, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/metrics')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f'Server on port {port} did not start in {timeout}s')
+
+def run_load(port: int, bodies: list, concurrency: int, compressed: bool) -> dict:
+    local = threading.local()
+    headers = {'Content-Type': 'application/json'}
+    if compressed:
+        headers['Content-Encoding'] = 'gzip'
+
+    def upload(body):
+        if getattr(local, 'conn', None) is None:
+            local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        start = time.perf_counter()
+        try:
+            local.conn.request('POST', '/degree_audit_post', body=body, headers=headers)
+            response = local.conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            local.conn.close()
+            local.conn = None
+            status = 'error'
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(upload, bodies))
+    elapsed = time.perf_counter() - start
+    latencies = [latency for status, latency in results if status == 200]
+    return {
+        'duration_s': elapsed,
+        'uploads_per_s': throughput(len(latencies), elapsed),
+        'latency': summarize(latencies) if latencies else None,
+        'statuses': {str(status): count for status, count in Counter(status for status, _ in results).items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servers', nargs='+', default=['dev', 'gunicorn'], choices=['dev', 'gunicorn'])
+    parser.add_argument('--uploads', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help='gunicorn workers, one per CPU by default')
+    parser.add_argument('--gzip', action='store_true', help='gzip the request bodies')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.uploads, args.seed)
+    results = {
+        'uploads': args.uploads, 'concurrency': args.concurrency, 'gzip': args.gzip,
+        'cpus': os.cpu_count(), 'servers': {}
+    }
+    for name in args.servers:
+        # a unique comment per server defeats the repeat-upload shortcut
+        bodies = [json.dumps({'html': f'{html}<!-- {name} {i} -->'}).encode() for i, html in enumerate(corpus)]
+        if args.gzip:
+            bodies = [gzip.compress(body) for body in bodies]
+        env = dict(os.environ, TRITONTHINK_DB=os.path.join(tempfile.mkdtemp(), 'users.db'))
+        server = subprocess.Popen(
+            server_command(name, args.port, args.workers), env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_up(args.port)
+            result = run_load(args.port, bodies, args.concurrency, args.gzip)
+        finally:
+            stop = time.perf_counter()
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        result['shutdown_s'] = time.perf_counter() - stop
+        results['servers'][name] = result
+        latency = result['latency'] or {'p50_ms': float('nan'), 'p99_ms': float('nan')}
+        print(f"{name:8} {result['uploads_per_s']:7.1f} uploads/s p50={latency['p50_ms']:.1f}ms "
+              f"p99={latency['p99_ms']:.1f}ms statuses={result['statuses']} "
+              f"shutdown={result['shutdown_s']:.2f}s")
+
+    if 'dev' in results['servers'] and 'gunicorn' in results['servers']:
+        dev, production = results['servers']['dev'], results['servers']['gunicorn']
+        if dev['uploads_per_s']:
+            results['speedup'] = production['uploads_per_s'] / dev['uploads_per_s']
+            print(f"gunicorn is {results['speedup']:.1f}x the development server's throughput")
+    save_results('load_test', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Compare the embedding model backends on CPU: single query encode latency, catalog encode
+throughput, resident memory and ranking agreement with the full precision model.
+
+    python -m benchmarks.model_backends [--backends torch onnx_int8] [--queries 200] [--k 10]
+
+Each backend is measured in its own subprocess so the memory of one model does not count towards
+the next. Queries are catalog course titles.
+'''
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from src.courses.catalog import load_snapshot
+from src.courses.model import MODEL_BACKENDS, load_model, encode, ranking_agreement
+from .common import summarize, save_results
+
+def rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def measure(backend: str, queries: int) -> dict:
+    '''
+    Measure one backend in this process and store its catalog and query vectors for the agreement
+    check.
+    '''
+    courses = load_snapshot()
+    descriptions = [course['desc'] for course in courses]
+    titles = [course['title'] for course in courses][:queries]
+
+    before = rss_mb()
+    start = time.perf_counter()
+    model = load_model(backend)
+    load_time = time.perf_counter() - start
+    loaded = rss_mb()
+
+    encode(model, titles[:8])
+    latencies = []
+    for title in titles:
+        start = time.perf_counter()
+        encode(model, [title])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    catalog = encode(model, descriptions)
+    encode_time = time.perf_counter() - start
+    np.savez(f'/tmp/model_backends-{backend}.npz', catalog=catalog, queries=encode(model, titles))
+    return {
+        'load_s': load_time,
+        'model_rss_mb': loaded - before,
+        'peak_rss_mb': rss_mb(),
+        'query_latency': summarize(latencies),
+        'catalog_encode_s': encode_time,
+        'throughput_per_s': len(descriptions) / encode_time
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', nargs='+', default=list(MODEL_BACKENDS), choices=MODEL_BACKENDS)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.queries)))
+        return
+
+    backends = ['torch'] + [backend for backend in args.backends if backend != 'torch']
+    results = {'catalog_size': len(load_snapshot()), 'k': args.k, 'backends': {}}
+    for backend in backends:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.model_backends', '--worker', backend,
+             '--queries', str(args.queries)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        # the full precision model is the baseline for ranking agreement
+        with np.load('/tmp/model_backends-torch.npz') as reference, \
+                np.load(f'/tmp/model_backends-{backend}.npz') as candidate:
+            result['agreement'] = ranking_agreement(reference['catalog'], candidate['catalog'],
+                                                    reference['queries'], candidate['queries'], args.k)
+        results['backends'][backend] = result
+        print(f"{backend:10} p50={result['query_latency']['p50_ms']:.2f}ms "
+              f"p99={result['query_latency']['p99_ms']:.2f}ms "
+              f"throughput={result['throughput_per_s']:.0f}/s rss={result['model_rss_mb']:.0f}MB "
+              f"overlap@{args.k}={result['agreement'][f'overlap@{args.k}']:.3f}")
+    save_results('model_backends', results)
+
+if __name__ == '__main__':
+    main()
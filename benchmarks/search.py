@@ -0,0 +1,103 @@
+'''
+Time src.functions.search.search over a recorded query log, for every division and a few
+department filters, offline against the stored snapshot, indexes and locally cached model.
+
+    python -m benchmarks.search [query_log] [--depts 3] [--limit 200] [--k 60]
+
+The query log has one keyword query per line (data/query_log.txt by default); without one, course
+titles from the catalog are used. Each filter combination runs the log once with empty caches
+(cold) and once more with the caches filled (warm). Course code lookups without keywords are timed
+separately.
+'''
+import argparse
+import os
+import random
+import time
+from collections import Counter
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+
+from src.const import SEARCH_FILTERS, SEARCH_MODE, MODEL_BACKEND, INDEX_BACKEND
+from src.courses.embed import EMBEDDING_CACHE, RESULT_CACHE
+from src.functions.search import search
+from src.resources import RESOURCES
+from .common import summarize, throughput, peak_memory, save_results
+
+def load_queries(path: str, limit: int, seed: int) -> list:
+    if os.path.exists(path):
+        with open(path) as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        print(f'No query log at {path}, using course titles')
+        queries = [course['title'] for course in RESOURCES.courses]
+    rng = random.Random(seed)
+    return rng.sample(queries, min(limit, len(queries)))
+
+def timed(calls: list) -> list:
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        search(**args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('query_log', nargs='?', default='data/query_log.txt')
+    parser.add_argument('--depts', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--k', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    names = ['courses', 'catalog', 'lexical']
+    if SEARCH_MODE != 'lexical':
+        names += ['index', 'index_meta', 'model']
+    for name in names:
+        RESOURCES.get(name)
+    load_time = time.perf_counter() - start
+
+    queries = load_queries(args.query_log, args.limit, args.seed)
+    depts = [''] + [dept for dept, _ in Counter(RESOURCES.catalog.depts.tolist()).most_common(args.depts)]
+    results = {
+        'query_log': args.query_log, 'queries': len(queries), 'k': args.k, 'search_mode': SEARCH_MODE,
+        'model_backend': MODEL_BACKEND, 'index_backend': INDEX_BACKEND, 'load_s': load_time,
+        'combinations': {}
+    }
+
+    cold, warm = [], []
+    for division in SEARCH_FILTERS:
+        for dept in depts:
+            calls = [{'keywords': query, 'dept': dept, 'division': division, 'k': args.k} for query in queries]
+            EMBEDDING_CACHE.clear()
+            RESULT_CACHE.clear()
+            cold_latencies = timed(calls)
+            warm_latencies = timed(calls)
+            cold.extend(cold_latencies)
+            warm.extend(warm_latencies)
+            results['combinations'][f'{division}|{dept or "*"}'] = {
+                'cold': summarize(cold_latencies), 'warm': summarize(warm_latencies)
+            }
+            print(f"{division:15} {dept or '*':6} cold p50={summarize(cold_latencies)['p50_ms']:.2f}ms "
+                  f"p99={summarize(cold_latencies)['p99_ms']:.2f}ms warm p50={summarize(warm_latencies)['p50_ms']:.3f}ms")
+
+    rng = random.Random(args.seed)
+    codes = RESOURCES.catalog.codes.tolist()
+    lookups = timed([{'numbers': ', '.join(rng.sample(codes, rng.randint(1, 5)))} for _ in range(len(queries))])
+
+    results['cold'] = summarize(cold)
+    results['cold_per_s'] = throughput(len(cold), sum(cold))
+    results['warm'] = summarize(warm)
+    results['warm_per_s'] = throughput(len(warm), sum(warm))
+    results['code_lookup'] = summarize(lookups)
+    results['code_lookup_per_s'] = throughput(len(lookups), sum(lookups))
+    results['memory'] = peak_memory()
+    print(f"all cold p50={results['cold']['p50_ms']:.2f}ms p95={results['cold']['p95_ms']:.2f}ms "
+          f"p99={results['cold']['p99_ms']:.2f}ms {results['cold_per_s']:.0f} queries/s, "
+          f"code lookup p50={results['code_lookup']['p50_ms']:.3f}ms, "
+          f"peak rss {results['memory']['peak_rss_mb']:.0f}MB")
+    save_results('search', results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+Synthetic degree audits in the markup the audit parsers read, for benchmarks that must run without
+real student data.
+
+    python -m benchmarks.synthetic out_dir [--count 200] [--seed 0]
+'''
+import argparse
+import os
+import random
+
+DEPARTMENTS = ('CSE', 'MATH', 'ECE', 'PHYS', 'COGS', 'DSC', 'BILD', 'CHEM')
+
+def _code(rng: random.Random) -> tuple:
+    return rng.choice(DEPARTMENTS), f"{rng.randint(1, 199)}{rng.choice(['', '', 'A', 'B', 'L'])}"
+
+def _subrequirement(rng: random.Random, index: int) -> str:
+    taken = ''.join(
+        f'<tr class="takenCourse"><td class="term">FA2{rng.randint(0, 4)}</td>'
+        f'<td class="course">{dept}{number}</td><td class="credit">4.0</td></tr>'
+        for dept, number in (_code(rng) for _ in range(rng.randint(0, 4)))
+    )
+    kind = rng.choice(['complete', 'courses', 'units'])
+    needs = ''
+    needed = ''
+    if kind == 'courses':
+        needs = f'<table class="subreqNeeds"><tr><td class="count">{rng.randint(1, 3)}</td></tr></table>'
+    elif kind == 'units':
+        needs = f'<table class="subreqNeeds"><tr><td class="hours">{rng.randint(1, 12)}.0</td></tr></table>'
+    if kind != 'complete':
+        needed = ''.join(
+            f'<span class="course draggable" department="{dept}" number="{number}">{dept} {number}</span>'
+            for dept, number in (_code(rng) for _ in range(rng.randint(1, 30)))
+        )
+    return (
+        f'<div class="subrequirement"><span class="subreqTitle">Requirement {index}</span>'
+        f'{needs}<table class="completedCourses"><tbody>{taken}</tbody></table>'
+        f'<div class="selectcourses">{needed}</div></div>'
+    )
+
+def _major(rng: random.Random, slot: str, title: str) -> tuple:
+    header = (
+        '<div class="requirement Status_NONE category_Zap/don\'t_grph">'
+        f'<div class="reqHeader">{title}</div></div>'
+    )
+    categories = ''.join(
+        f'<div class="requirement {slot}"><div class="reqTitle">{title} Category {c}</div>'
+        + ''.join(_subrequirement(rng, s) for s in range(rng.randint(1, 6)))
+        + '</div>'
+        for c in range(rng.randint(2, 8))
+    )
+    return header, categories
+
+def synthetic_audit(rng: random.Random, pid: str) -> str:
+    '''
+    One audit with a major, sometimes a second major, and a random mix of complete, course and
+    unit requirements.
+    '''
+    majors = [_major(rng, 'category_Major', rng.choice(['Computer Science', 'Data Science', 'Mathematics']))]
+    if rng.random() < 0.2:
+        majors.append(_major(rng, 'category_Second_Major', rng.choice(['Cognitive Science', 'Physics'])))
+    return (
+        '<html><head><title>Degree Audit</title></head><body>'
+        '<div class="auditHeader"><div class="auditHeaderEntryLabel col-1">PID</div>'
+        f'<div class="auditHeaderEntryValue">{pid}</div></div>'
+        '<div class="requirement category_Overall_Hrs"><table>'
+        f'<tr class="reqEarned"><td><span class="hours">{rng.randint(0, 180)}.0</span></td></tr>'
+        f'<tr class="reqIpDetail"><td><span class="hours">{rng.randint(0, 20)}.0</span></td></tr>'
+        '</table></div>'
+        + ''.join(header for header, _ in majors)
+        + ''.join(categories for _, categories in majors)
+        + '</body></html>'
+    )
+
+def synthetic_corpus(count: int, seed: int = 0) -> list:
+    '''
+    count audits with distinct PIDs, the same for the same seed.
+    '''
+    rng = random.Random(seed)
+    return [synthetic_audit(rng, f'A{i:08d}') for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for i, html in enumerate(synthetic_corpus(args.count, args.seed)):
+        with open(f'{args.out_dir}/{i}.html', 'w') as f:
+            f.write(html)
+    print(f'Wrote {args.count} audits to {args.out_dir}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''
+Production serving of the audit server:
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The app is imported once in the master process, so the database schema, the audit parser and its
+compiled XPath queries are set up before the workers are forked and shared copy-on-write. Each
+worker is a process, so uploads are parsed in parallel; its threads overlap reading request
+bodies, SQLite writes and keep-alive connections. Settings can be overridden with the
+TRITONTHINK_* variables below or gunicorn's own command line flags.
+
+Uploads should be handled inline (AUDIT_INGEST = 'inline'): the workers already parse in
+parallel, and the background ingestor's job statuses live in one process, which a status request
+routed to another worker would not see.
+
+The /profiler route and audit status lookups by PID are only served when TRITONTHINK_ADMIN_TOKEN
+is set, and then only to requests with that bearer token, since behind a reverse proxy every
+request comes from localhost. /profiler controls the profiler of whichever worker handles the
+request.
+'''
+import multiprocessing
+import os
+
+bind = os.environ.get('TRITONTHINK_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('TRITONTHINK_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('TRITONTHINK_THREADS', 4))
+preload_app = True
+
+# audits can take a while to upload from slow connections and to parse
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+# restart workers now and then so fragmentation from large audits does not pile up
+max_requests = 2000
+max_requests_jitter = 200
+# headers stay small; the body is bounded by MAX_CONTENT_LENGTH in the app
+limit_request_line = 4094
+limit_request_fields = 50
+
+accesslog = os.environ.get('TRITONTHINK_ACCESS_LOG')
+errorlog = '-'
+
+# a minimal audit, parsed once in the master so lazily initialised parser state is shared
+_WARMUP = (
+    '<html><body><div class="auditHeader"><div class="auditHeaderEntryLabel col-1">PID</div>'
+    '<div class="auditHeaderEntryValue">A00000000</div></div></body></html>'
+)
+
+def when_ready(server):
+    from src.audit import process_upload
+    process_upload(_WARMUP)
+    server.log.info("Audit parser warmed up")
+
+def worker_exit(server, worker):
+    # store audits that are still queued before the worker goes away
+    from server import ingestor
+    ingestor.stop(graceful_timeout)
@@ -1,11 +1,18 @@
 
 
 from src.const import BOT, TOKEN
+from src.resources import RESOURCES
+from src.notify import listen
+from src.discord_bot import commands  # registers the slash commands
 from src.discord_bot.paginator import MultiPage
 
 @BOT.event
 async def on_ready():
     print("Ready!")
     BOT.add_cog(MultiPage(BOT))
+    RESOURCES.warm()
+    commands.REMINDERS.start()
+    commands.METRICS_REPORTER.start()
+    await listen(commands.on_audit_stored)
 
 BOT.run(TOKEN)
\ No newline at end of file
@@ -1,137 +1,185 @@
-import re
+import hmac
+from io import BytesIO
 import os
+from time import perf_counter
+import zlib
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
-import bleach
-from bs4 import BeautifulSoup
 
-from src.db import insert_or_update_user
-from src.const import ALLOWED_TAGS, ALLOWED_ATTRIBUTES
+from src.audit import audit_hash, process_upload, save_failed_audit
+from src.db import init_db, close, insert_or_update_user, find_audit
+from src.ingest import AuditIngestor
+from src.notify import notify_audit
+from src.const import AUDIT_PARSER, AUDIT_INGEST, AUDIT_MAX_BYTES
+from src.metrics import METRICS, PROFILER
 
 app = Flask(__name__)
+app.config['AUDIT_PARSER'] = AUDIT_PARSER
+# 'inline' handles uploads within the request, 'queue' hands them to the background ingestor
+app.config['AUDIT_INGEST'] = AUDIT_INGEST
+app.config['MAX_CONTENT_LENGTH'] = AUDIT_MAX_BYTES
+# bearer token for /profiler and audit status by PID, which are disabled when it is not set
+app.config['ADMIN_TOKEN'] = os.environ.get('TRITONTHINK_ADMIN_TOKEN')
 CORS(app, resources={r"/degree_audit_post": {"origins": "https://act.ucsd.edu"}})
 
-def process_audit(html: str):
-    soup = BeautifulSoup(html, 'html.parser')
-    for br_tag in soup.find_all('br'):
-        br_tag.insert_before('\n')
-        br_tag.decompose()
-    audit = {}
-    
-    # find pid
-    pid_div = [result for result in soup.find_all('div', class_='auditHeaderEntryLabel col-1') if 'PID' in result.text]
-    if not pid_div:
-        return -1
-
-    next_div = pid_div[0].find_next_sibling('div')
-    pid = next_div.text.strip()
-    audit['pid'] = pid
-    
-    unit_totals = soup.find('div', class_='category_Overall_Hrs')
-    if not unit_totals:
-        return -1
-    earned_units = 0
-    wip_units = 0
-    if (earned := unit_totals.find('tr', class_='reqEarned')):
-        earned_units = float(earned.find('span', class_=['hours', 'number']).text.strip())
-    if (wip := unit_totals.find('tr', class_='reqIpDetail')):
-        wip_units = float(wip.find('span', class_=['hours', 'number']).text.strip())
-    audit['earned_units'] = earned_units
-    audit['wip_units'] = wip_units
-    
-    def normalize_code(code: str):
-        for i, c in enumerate(code):
-            if c.isdigit():
-                return code[:i].strip() + ' ' + code[i:].strip()
-            
-    def extract_major_categories(categories: list):
-        major_reqs = []
-        for major_category in categories:
-            major_category_dict = {}
-            major_category_dict['major_category'] = major_category.find('div', class_='reqTitle').text.strip()
-            major_category_dict['subreqs'] = []
-            subreqs = major_category.find_all('div', class_='subrequirement')
-            for subreq in subreqs:
-                if (title := subreq.find('span', class_='subreqTitle')):
-                    title = title.text
-                else:
-                    title = 'Failed to load title :('
-                
-                subreq_dict = {
-                    'title': ' '.join(title.strip().split()),
-                    'progress': {
-                        'type': 'complete',
-                        'remaining': 0
-                    },
-                    'completed_courses': [],
-                    'needed_courses': []
-                }
-                subreq_needs = subreq.find('table', class_='subreqNeeds')
-                if subreq_needs:
-                    units_left = subreq_needs.find('td', class_='hours')
-                    if units_left:
-                        subreq_dict['progress']['type'] = 'units'
-                        subreq_dict['progress']['remaining'] = float(units_left.text.strip())
-                    courses_left = subreq_needs.find('td', class_='count')
-                    if courses_left:
-                        subreq_dict['progress']['type'] = 'courses'
-                        subreq_dict['progress']['remaining'] = int(courses_left.text.strip())
-                
-                completed_courses = subreq.find_all('tr', class_='takenCourse')
-                completed_courses = [normalize_code(course.find('td', class_='course').text) for course in completed_courses]
-                subreq_dict['completed_courses'] = completed_courses
-                needed_courses = subreq.find_all(lambda tag: 'course' in tag.get('class', []) and 'draggable' in tag.get('class', []))
-                needed_courses = [
-                    f'{course.get('department').strip()} {course.get('number').strip()}'
-                    for course in needed_courses
-                ]
-                subreq_dict['needed_courses'] = needed_courses
-                major_category_dict['subreqs'].append(subreq_dict)
-            major_reqs.append(major_category_dict)
-        return major_reqs
-    sections = soup.find_all(lambda tag: 'requirement' in tag.get('class', []) and 'Status_NONE' in tag.get('class', []) and 'category_Zap/don\'t_grph' in tag.get('class', []))
-    major_categories = soup.find_all('div', class_='category_Major')
-    if major_categories:
-        audit['major'] = {}
-        audit['major']['title'] = sections[0].find('div', class_='reqHeader').text.strip()
-        audit['major']['categories'] = extract_major_categories(major_categories)
-
-    second_major_categories = soup.find_all('div', class_='category_Second_Major')
-    if second_major_categories:
-        audit['second_major'] = {}
-        audit['second_major']['title'] = sections[1].find('div', class_='reqHeader').text.strip()
-        audit['second_major']['categories'] = extract_major_categories(second_major_categories)
-    
-    return audit
-    
+init_db()
+# the schema connection is not kept, so preforked workers do not inherit an open SQLite handle
+close()
+ingestor = AuditIngestor()
+METRICS.gauge('audit.queue', lambda: ingestor.queue.qsize())
+
+@app.before_request
+def start_timer():
+    g.start = perf_counter()
+
+@app.teardown_request
+def record_request(error=None):
+    if 'start' in g:
+        METRICS.observe(f'http.{request.endpoint or "unknown"}', perf_counter() - g.start)
+        if error is not None:
+            METRICS.inc(f'http.{request.endpoint or "unknown"}.errors')
+
+# zlib window bits for each supported request Content-Encoding
+REQUEST_ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+@app.before_request
+def decompress_request():
+    '''
+    Inflate gzip and deflate encoded request bodies before they are read. The compressed body is
+    bounded by MAX_CONTENT_LENGTH and the inflated body by AUDIT_MAX_BYTES, so a small compressed
+    upload cannot expand without limit.
+    '''
+    encoding = request.headers.get('Content-Encoding', '').strip().lower()
+    if not encoding or encoding == 'identity':
+        return None
+    if encoding not in REQUEST_ENCODINGS:
+        return jsonify({"error": f"Unsupported Content-Encoding {encoding}."}), 415
+    if request.content_length is None:
+        return jsonify({"error": "Compressed uploads need a Content-Length."}), 411
+    if request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({"error": "Degree audit is too large."}), 413
+    decompressor = zlib.decompressobj(REQUEST_ENCODINGS[encoding])
+    try:
+        body = decompressor.decompress(
+            request.environ['wsgi.input'].read(request.content_length), AUDIT_MAX_BYTES + 1
+        )
+    except zlib.error:
+        return jsonify({"error": f"Invalid {encoding} request body."}), 400
+    if len(body) > AUDIT_MAX_BYTES or decompressor.unconsumed_tail:
+        return jsonify({"error": "Degree audit is too large."}), 413
+    METRICS.inc(f'http.{encoding}')
+    # the request stream has not been created yet, so it is built from the inflated body
+    request.environ['wsgi.input'] = BytesIO(body)
+    request.environ['CONTENT_LENGTH'] = str(len(body))
+    request.environ.pop('HTTP_CONTENT_ENCODING', None)
+    return None
 
 @app.route('/degree_audit_post', methods=['POST'])
 def receive_audit():
+    with PROFILER.trace('audit'):
+        return _receive_audit()
+
+def _receive_audit():
     if not request.is_json:
         return jsonify({"error": "Invalid request. Expected JSON data."}), 400
     
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid request. Expected a JSON object."}), 400
     html_content = data.get('html')
     
     if not html_content:
         return jsonify({"error": "No HTML content provided."}), 400
-    sanitized_html = bleach.clean(html_content, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
-    sanitized_html = re.sub(r"&lt;.*?&gt;", "", sanitized_html)
-    try:
-        processed_audit = process_audit(sanitized_html)
-    except AttributeError:
-        next_id = 0
-        while os.path.exists(f'data/failed_audits/{next_id}.html'):
-            next_id += 1
-        with open(f'data/failed_audits/{next_id}.html', 'w') as f:
-            f.write(sanitized_html)
-            
-    if processed_audit == -1:
+    if not isinstance(html_content, str):
+        return jsonify({"error": "Invalid request. Expected the HTML content as a string."}), 400
+
+    upload_hash = audit_hash(html_content)
+    if (user := find_audit(upload_hash)):
+        # the same audit was already stored for this PID
+        METRICS.inc('audit.duplicate')
+        notify_audit(user[1], user[2])
+        return jsonify({"message": "Degree audit received successfully!"}), 200
+
+    if app.config['AUDIT_INGEST'] == 'queue':
+        job = ingestor.submit(html_content, upload_hash)
+        if job is None:
+            METRICS.inc('audit.rejected')
+            return jsonify({"error": "Too many audits are being processed. Please try again shortly."}), 429
+        return jsonify({"message": "Degree audit received successfully!", "job": job}), 202
+
+    processed_audit, failed_html = process_upload(html_content, app.config['AUDIT_PARSER'])
+    if failed_html is not None:
+        METRICS.inc('audit.failed')
+        save_failed_audit(failed_html)
+
+    if processed_audit is None or processed_audit == -1:
+        METRICS.inc('audit.invalid')
         return jsonify({"error": "Invalid degree audit!"}), 400
 
-    insert_or_update_user(processed_audit['pid'], processed_audit)
+    with METRICS.timer('audit.write'):
+        stored = insert_or_update_user(processed_audit['pid'], processed_audit, upload_hash)
+    METRICS.inc('audit.stored')
+    if stored:
+        notify_audit(*stored)
     return jsonify({"message": "Degree audit received successfully!"}), 200
 
+def _check_admin():
+    '''
+    An error response unless the request carries ADMIN_TOKEN as a bearer token. Everything
+    behind a reverse proxy comes from localhost, so the remote address says nothing.
+    '''
+    token = app.config.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({"error": "Not found."}), 404
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+        return jsonify({"error": "Forbidden."}), 403
+    return None
+
+@app.route('/degree_audit_status/<key>', methods=['GET'])
+def audit_status(key: str):
+    '''
+    Status of a queued audit by the job id returned on upload. Lookups by PID reveal whether a PID
+    uploaded and is linked to an account, so they need ADMIN_TOKEN.
+    '''
+    status = ingestor.status(key)
+    if status is None:
+        if (error := _check_admin()):
+            return error
+        status = ingestor.pid_status(key.strip().upper())
+    if status is None:
+        return jsonify({"error": "Unknown audit."}), 404
+    return jsonify(status), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    '''
+    Request, audit and search metrics of this process, in the Prometheus text format or as JSON
+    with ?format=json.
+    '''
+    if request.args.get('format') == 'json':
+        return jsonify(METRICS.snapshot()), 200
+    return Response(METRICS.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profiler', methods=['GET', 'POST'])
+def profiler():
+    '''
+    Status of the sampling profiler, or turn it on or off with a JSON body like
+    {"enabled": true, "threshold_ms": 500}. Needs ADMIN_TOKEN.
+    '''
+    if (error := _check_admin()):
+        return error
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('enabled'):
+            threshold = data.get('threshold_ms')
+            PROFILER.start(threshold / 1000 if threshold is not None else None)
+        else:
+            PROFILER.stop()
+    return jsonify(PROFILER.status()), 200
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
\ No newline at end of file
+    # development server only; production runs under gunicorn with gunicorn.conf.py, and
+    # FLASK_DEBUG=1 turns the debugger on
+    app.run(host='0.0.0.0', port=8000)
\ No newline at end of file
@@ -0,0 +1,335 @@
+import hashlib
+import os
+import re
+
+import bleach
+from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+from .const import AUDIT_PARSER, ALLOWED_TAGS, ALLOWED_ATTRIBUTES
+from .metrics import METRICS
+
+_ESCAPED_TAG = re.compile(r"&lt;.*?&gt;")
+_TAG = re.compile(r"<.*?>")
+_SAFE_PROTOCOLS = ('http:', 'https:', 'mailto:')
+
+def sanitize_html(html: str) -> str:
+    '''
+    Reference sanitiser: escape disallowed markup with bleach, then remove the escaped tags.
+    '''
+    sanitized_html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES)
+    return _ESCAPED_TAG.sub("", sanitized_html)
+
+def sanitize_tree(root):
+    '''
+    Sanitise a parsed document in place: comments are removed, disallowed tags are unwrapped so
+    only their text remains, disallowed attributes and unsafe links are dropped, and anything
+    tag-like left in a text node is removed.
+
+    This matches sanitize_html except for a '<' that does not start a tag, as in "3 < 4". The
+    reference escapes it and its regex then deletes everything from it up to the end of the next
+    escaped tag, often much of the document. Here it is kept as text, and lxml escapes it again
+    if the document is serialised.
+    '''
+    allowed_tags = set(ALLOWED_TAGS) | {'html', 'head', 'body'}
+    for element in list(root.iter()):
+        if not isinstance(element.tag, str):
+            element.drop_tree()
+            continue
+        if element.text and '<' in element.text:
+            element.text = _TAG.sub('', element.text)
+        if element.tail and '<' in element.tail:
+            element.tail = _TAG.sub('', element.tail)
+        if element.tag not in allowed_tags:
+            element.drop_tag()
+            continue
+        allowed = ALLOWED_ATTRIBUTES['*'] + ALLOWED_ATTRIBUTES.get(element.tag, [])
+        for name in element.attrib.keys():
+            if name not in allowed:
+                del element.attrib[name]
+        href = element.get('href')
+        if href is not None and ':' in href and not href.strip().lower().startswith(_SAFE_PROTOCOLS):
+            del element.attrib['href']
+    return root
+
+def process_audit_bs4(html: str):
+    '''
+    Reference parser: BeautifulSoup with the pure-Python html.parser.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    for br_tag in soup.find_all('br'):
+        br_tag.insert_before('\n')
+        br_tag.decompose()
+    audit = {}
+    
+    # find pid
+    pid_div = [result for result in soup.find_all('div', class_='auditHeaderEntryLabel col-1') if 'PID' in result.text]
+    if not pid_div:
+        return -1
+
+    next_div = pid_div[0].find_next_sibling('div')
+    pid = next_div.text.strip()
+    audit['pid'] = pid
+    
+    unit_totals = soup.find('div', class_='category_Overall_Hrs')
+    if not unit_totals:
+        return -1
+    earned_units = 0
+    wip_units = 0
+    if (earned := unit_totals.find('tr', class_='reqEarned')):
+        earned_units = float(earned.find('span', class_=['hours', 'number']).text.strip())
+    if (wip := unit_totals.find('tr', class_='reqIpDetail')):
+        wip_units = float(wip.find('span', class_=['hours', 'number']).text.strip())
+    audit['earned_units'] = earned_units
+    audit['wip_units'] = wip_units
+    
+    def normalize_code(code: str):
+        for i, c in enumerate(code):
+            if c.isdigit():
+                return code[:i].strip() + ' ' + code[i:].strip()
+            
+    def extract_major_categories(categories: list):
+        major_reqs = []
+        for major_category in categories:
+            major_category_dict = {}
+            major_category_dict['major_category'] = major_category.find('div', class_='reqTitle').text.strip()
+            major_category_dict['subreqs'] = []
+            subreqs = major_category.find_all('div', class_='subrequirement')
+            for subreq in subreqs:
+                if (title := subreq.find('span', class_='subreqTitle')):
+                    title = title.text
+                else:
+                    title = 'Failed to load title :('
+                
+                subreq_dict = {
+                    'title': ' '.join(title.strip().split()),
+                    'progress': {
+                        'type': 'complete',
+                        'remaining': 0
+                    },
+                    'completed_courses': [],
+                    'needed_courses': []
+                }
+                subreq_needs = subreq.find('table', class_='subreqNeeds')
+                if subreq_needs:
+                    units_left = subreq_needs.find('td', class_='hours')
+                    if units_left:
+                        subreq_dict['progress']['type'] = 'units'
+                        subreq_dict['progress']['remaining'] = float(units_left.text.strip())
+                    courses_left = subreq_needs.find('td', class_='count')
+                    if courses_left:
+                        subreq_dict['progress']['type'] = 'courses'
+                        subreq_dict['progress']['remaining'] = int(courses_left.text.strip())
+                
+                completed_courses = subreq.find_all('tr', class_='takenCourse')
+                completed_courses = [normalize_code(course.find('td', class_='course').text) for course in completed_courses]
+                subreq_dict['completed_courses'] = completed_courses
+                needed_courses = subreq.find_all(lambda tag: 'course' in tag.get('class', []) and 'draggable' in tag.get('class', []))
+                needed_courses = [
+                    f"{course.get('department').strip()} {course.get('number').strip()}"
+                    for course in needed_courses
+                ]
+                subreq_dict['needed_courses'] = needed_courses
+                major_category_dict['subreqs'].append(subreq_dict)
+            major_reqs.append(major_category_dict)
+        return major_reqs
+    sections = soup.find_all(lambda tag: 'requirement' in tag.get('class', []) and 'Status_NONE' in tag.get('class', []) and 'category_Zap/don\'t_grph' in tag.get('class', []))
+    major_categories = soup.find_all('div', class_='category_Major')
+    if major_categories:
+        audit['major'] = {}
+        audit['major']['title'] = sections[0].find('div', class_='reqHeader').text.strip()
+        audit['major']['categories'] = extract_major_categories(major_categories)
+
+    second_major_categories = soup.find_all('div', class_='category_Second_Major')
+    if second_major_categories:
+        audit['second_major'] = {}
+        audit['second_major']['title'] = sections[1].find('div', class_='reqHeader').text.strip()
+        audit['second_major']['categories'] = extract_major_categories(second_major_categories)
+    
+    return audit
+
+def _has_class(*names: str) -> str:
+    return ' and '.join(f'contains(concat(" ", normalize-space(@class), " "), " {name} ")' for name in names)
+
+_STRING = etree.XPath('string()')
+_PID_LABELS = etree.XPath("//div[normalize-space(@class)='auditHeaderEntryLabel col-1']")
+_NEXT_DIV = etree.XPath('following-sibling::div[1]')
+_OVERALL_HRS = etree.XPath(f"(//div[{_has_class('category_Overall_Hrs')}])[1]")
+_EARNED = etree.XPath(f"(.//tr[{_has_class('reqEarned')}])[1]")
+_IN_PROGRESS = etree.XPath(f"(.//tr[{_has_class('reqIpDetail')}])[1]")
+_UNITS = etree.XPath(f"(.//span[{_has_class('hours')} or {_has_class('number')}])[1]")
+_SECTION_CLASSES = ('requirement', 'Status_NONE', "category_Zap/don't_grph")
+_SECTIONS = etree.XPath(f"//*[{_has_class(*_SECTION_CLASSES)}]")
+_MAJOR_CATEGORIES = etree.XPath(f"//div[{_has_class('category_Major')}]")
+_SECOND_MAJOR_CATEGORIES = etree.XPath(f"//div[{_has_class('category_Second_Major')}]")
+_REQ_TITLE = etree.XPath(f"(.//div[{_has_class('reqTitle')}])[1]")
+_REQ_HEADER = etree.XPath(f"(.//div[{_has_class('reqHeader')}])[1]")
+_SUBREQS = etree.XPath(f".//div[{_has_class('subrequirement')}]")
+_SUBREQ_TITLE = etree.XPath(f"(.//span[{_has_class('subreqTitle')}])[1]")
+_SUBREQ_NEEDS = etree.XPath(f"(.//table[{_has_class('subreqNeeds')}])[1]")
+_NEEDS_HOURS = etree.XPath(f"(.//td[{_has_class('hours')}])[1]")
+_NEEDS_COUNT = etree.XPath(f"(.//td[{_has_class('count')}])[1]")
+_TAKEN_COURSES = etree.XPath(f".//tr[{_has_class('takenCourse')}]")
+_COURSE_CELL = etree.XPath(f"(.//td[{_has_class('course')}])[1]")
+_NEEDED_COURSES = etree.XPath(f".//*[{_has_class('course', 'draggable')}]")
+
+def _first(xpath: etree.XPath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+def _text(element) -> str:
+    # same failure as the reference parser on a missing element
+    if element is None:
+        raise AttributeError("'NoneType' object has no attribute 'text'")
+    return _STRING(element)
+
+def _normalize_code(code: str):
+    for i, c in enumerate(code):
+        if c.isdigit():
+            return code[:i].strip() + ' ' + code[i:].strip()
+
+def _extract_major_categories(categories: list) -> list:
+    major_reqs = []
+    for major_category in categories:
+        major_category_dict = {
+            'major_category': _text(_first(_REQ_TITLE, major_category)).strip(),
+            'subreqs': []
+        }
+        for subreq in _SUBREQS(major_category):
+            title = _first(_SUBREQ_TITLE, subreq)
+            title = _text(title) if title is not None else 'Failed to load title :('
+            subreq_dict = {
+                'title': ' '.join(title.strip().split()),
+                'progress': {
+                    'type': 'complete',
+                    'remaining': 0
+                },
+                'completed_courses': [],
+                'needed_courses': []
+            }
+            subreq_needs = _first(_SUBREQ_NEEDS, subreq)
+            if subreq_needs is not None:
+                units_left = _first(_NEEDS_HOURS, subreq_needs)
+                if units_left is not None:
+                    subreq_dict['progress']['type'] = 'units'
+                    subreq_dict['progress']['remaining'] = float(_text(units_left).strip())
+                courses_left = _first(_NEEDS_COUNT, subreq_needs)
+                if courses_left is not None:
+                    subreq_dict['progress']['type'] = 'courses'
+                    subreq_dict['progress']['remaining'] = int(_text(courses_left).strip())
+
+            subreq_dict['completed_courses'] = [
+                _normalize_code(_text(_first(_COURSE_CELL, course))) for course in _TAKEN_COURSES(subreq)
+            ]
+            subreq_dict['needed_courses'] = [
+                f"{course.get('department').strip()} {course.get('number').strip()}"
+                for course in _NEEDED_COURSES(subreq)
+            ]
+            major_category_dict['subreqs'].append(subreq_dict)
+        major_reqs.append(major_category_dict)
+    return major_reqs
+
+def parse_document(html: str):
+    try:
+        return lxml_html.document_fromstring(html)
+    except etree.ParserError:
+        return None
+
+def process_audit_lxml(html: str):
+    '''
+    Parse a degree audit with lxml and precompiled XPath queries, producing the same audit as
+    process_audit_bs4.
+    '''
+    root = parse_document(html)
+    return -1 if root is None else extract_audit(root)
+
+def extract_audit(root):
+    '''
+    Extract the audit from a parsed document.
+    '''
+    for br in root.iter('br'):
+        br.tail = '\n' + (br.tail or '')
+    audit = {}
+
+    pid_div = [label for label in _PID_LABELS(root) if 'PID' in _text(label)]
+    if not pid_div:
+        return -1
+    audit['pid'] = _text(_first(_NEXT_DIV, pid_div[0])).strip()
+
+    unit_totals = _first(_OVERALL_HRS, root)
+    if unit_totals is None:
+        return -1
+    earned_units = 0
+    wip_units = 0
+    if (earned := _first(_EARNED, unit_totals)) is not None:
+        earned_units = float(_text(_first(_UNITS, earned)).strip())
+    if (wip := _first(_IN_PROGRESS, unit_totals)) is not None:
+        wip_units = float(_text(_first(_UNITS, wip)).strip())
+    audit['earned_units'] = earned_units
+    audit['wip_units'] = wip_units
+
+    sections = _SECTIONS(root)
+    if (major_categories := _MAJOR_CATEGORIES(root)):
+        audit['major'] = {
+            'title': _text(_first(_REQ_HEADER, sections[0])).strip(),
+            'categories': _extract_major_categories(major_categories)
+        }
+    if (second_major_categories := _SECOND_MAJOR_CATEGORIES(root)):
+        audit['second_major'] = {
+            'title': _text(_first(_REQ_HEADER, sections[1])).strip(),
+            'categories': _extract_major_categories(second_major_categories)
+        }
+    return audit
+
+AUDIT_PARSERS = {
+    'bs4': process_audit_bs4,
+    'lxml': process_audit_lxml
+}
+
+def process_audit(html: str, parser: str = AUDIT_PARSER):
+    '''
+    Parse a sanitised degree audit into a dict, or return -1 if it is not a degree audit.
+    '''
+    return AUDIT_PARSERS[parser](html)
+
+def process_upload(html: str, parser: str = AUDIT_PARSER) -> tuple:
+    '''
+    Sanitise and parse an uploaded audit. Returns (audit, None), where audit is -1 for a document
+    that is not a degree audit, or (None, sanitized_html) if the audit could not be parsed.
+
+    With the lxml parser the document is parsed once and sanitised in place before extraction;
+    the sanitised HTML is only serialised when parsing fails.
+    '''
+    if parser != 'lxml':
+        with METRICS.timer('audit.sanitize'):
+            sanitized_html = sanitize_html(html)
+        try:
+            with METRICS.timer('audit.parse'):
+                return process_audit(sanitized_html, parser), None
+        except AttributeError:
+            return None, sanitized_html
+    with METRICS.timer('audit.parse'):
+        root = parse_document(html)
+    if root is None:
+        return -1, None
+    with METRICS.timer('audit.sanitize'):
+        sanitize_tree(root)
+    try:
+        with METRICS.timer('audit.extract'):
+            return extract_audit(root), None
+    except AttributeError:
+        return None, lxml_html.tostring(root, encoding='unicode')
+
+def audit_hash(html: str) -> str:
+    '''
+    Hash of an uploaded audit, used to recognise repeat uploads before parsing them.
+    '''
+    return hashlib.sha256(html.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+def save_failed_audit(html: str) -> None:
+    os.makedirs('data/failed_audits', exist_ok=True)
+    next_id = 0
+    while os.path.exists(f'data/failed_audits/{next_id}.html'):
+        next_id += 1
+    with open(f'data/failed_audits/{next_id}.html', 'w') as f:
+        f.write(html)
@@ -1,25 +1,21 @@
+from time import perf_counter
+_start = perf_counter()
 print('[Initialization] Loading files...')
 from datetime import datetime
-import os
+from zoneinfo import ZoneInfo
 import re
 
-from sentence_transformers import SentenceTransformer
-import faiss
 import discord
 
 from .utils import read_json
 
-__all__ = ['MODEL', 'COURSES', 'INDEX', 'YEAR', 'ENROLLMENT_TIMES', 'ALPHABET', 'ALLOWED_TAGS', 
-           'ALLOWED_ATTRIBUTES', 'SEARCH_FILTERS']
+__all__ = ['YEAR', 'ENROLLMENT_TIMES', 'ENROLLMENT_TZ', 'ALPHABET', 'ALLOWED_TAGS', 
+           'ALLOWED_ATTRIBUTES', 'SEARCH_FILTERS', 'SEARCH_TOP_K', 'MODEL_NAME', 'MODEL_BACKEND', 'INDEX_BACKEND',
+           'QUERY_CACHE_SIZE', 'QUERY_CACHE_TTL', 'SEARCH_MODE', 'RRF_K', 'NOTIFY_ADDR',
+           'AUDIT_PARSER', 'AUDIT_INGEST', 'AUDIT_MAX_BYTES', 'AUDIT_QUEUE_SIZE', 'AUDIT_WORKERS', 'METRICS_DUMP_INTERVAL']
 
 TOKEN = read_json('data/config/bot.json')['token']
 
-MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-COURSES = []
-for dept in os.listdir('data/courses'):
-    COURSES.extend(read_json(f'data/courses/{dept}'))
-INDEX = faiss.read_index("data/course_catalog.faiss")
-
 YEAR = read_json('data/config/year.json')['year']
 _times = read_json(f'data/enrollment_calendar/{YEAR}.json')
 ENROLLMENT_TIMES = {
@@ -28,8 +24,14 @@ ENROLLMENT_TIMES = {
         for k, v in times.items()
     } for qtr, times in _times.items()
 }
+ENROLLMENT_TZ = ZoneInfo('America/Los_Angeles')
 ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+AUDIT_PARSER = 'lxml'
+AUDIT_INGEST = 'inline'
+AUDIT_MAX_BYTES = 16 * 1024 * 1024
+AUDIT_QUEUE_SIZE = 256
+AUDIT_WORKERS = 4
 ALLOWED_TAGS = ['b', 'i', 'u', 'strong', 'em', 'p', 'a', 'ul', 'ol', 'li', 'br', 'h1', 'h2', 'h3',
                 'h4', 'h5', 'h6', 'div', 'table', 'tr', 'td', 'span', 'tbody']
 ALLOWED_ATTRIBUTES = {
@@ -38,6 +40,9 @@ ALLOWED_ATTRIBUTES = {
     'span': ['department', 'number']
 }
 
+NOTIFY_ADDR = ('127.0.0.1', 8001)
+METRICS_DUMP_INTERVAL = 5 * 60
+
 SEARCH_FILTERS = {
     "Lower Division": re.compile(r"[A-Z]{2,4} ([0-9]{1,2}[A-Za-z]*)\b"),
     "Upper Division": re.compile(r"[A-Z]{2,4} (1[0-9]{2}[A-Za-z]*)\b"),
@@ -45,6 +50,14 @@ SEARCH_FILTERS = {
     "Undergraduate": re.compile(r"([A-Z]{2,4} ([0-9]{1,2}[A-Za-z]*)\b)|([A-Z]{2,4} (1[0-9]{2}[A-Za-z]*)\b)"),
     "All Courses": re.compile(r".*")
 }
+SEARCH_TOP_K = 60
+MODEL_NAME = 'all-MiniLM-L6-v2'
+MODEL_BACKEND = 'torch'
+INDEX_BACKEND = 'flat'
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 6 * 60 * 60
+SEARCH_MODE = 'hybrid'
+RRF_K = 60
 
 BOT = discord.Bot(debug_guilds=[1307184534336442459])
-print('[Initialization] Done!')
\ No newline at end of file
+print(f'[Initialization] Done in {perf_counter() - _start:.2f}s!')
\ No newline at end of file
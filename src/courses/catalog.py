@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+
+from ..utils import read_json, write_json
+
+SNAPSHOT_PATH = 'data/course_catalog.json'
+
+def normalize_code(code: str) -> str:
+    '''
+    Key for course code lookups, so that 'cse 100', 'CSE100' and 'CSE  100' all match.
+    '''
+    return ''.join(code.split()).upper()
+
+class Catalog:
+    '''
+    Column-oriented view of the course list. Course codes, departments and course numbers are
+    held in NumPy arrays, and the division and department filters are precomputed as boolean
+    masks so that a search only combines masks instead of matching every course. Course codes,
+    including each department of a cross-listed code, are indexed to their rows.
+    '''
+    def __init__(self, courses: list, divisions: dict):
+        self.courses = courses
+        self.codes = np.array([course['code'] for course in courses], dtype=str)
+        split = [course['code'].rsplit(' ', 1) for course in courses]
+        self.depts = np.array([parts[0] for parts in split], dtype=str)
+        self.numbers = np.array([parts[-1] for parts in split], dtype=str)
+
+        self.division_masks = {
+            division: np.fromiter(
+                (bool(pattern.match(code)) for code in self.codes), dtype=bool, count=len(courses)
+            ) for division, pattern in divisions.items()
+        }
+        self.dept_masks = {}
+        for dept in np.unique(self.depts):
+            mask = self.depts == dept
+            # cross-listed courses belong to each of their departments, as in the scraped files
+            for subdept in dept.split('/'):
+                if subdept in self.dept_masks:
+                    self.dept_masks[subdept] = self.dept_masks[subdept] | mask
+                else:
+                    self.dept_masks[subdept] = mask
+        self._prefix_masks = {}
+
+        code_index = {}
+        for row, (code, dept, number) in enumerate(zip(self.codes, self.depts, self.numbers)):
+            aliases = {code}
+            if dept != number:
+                aliases.update(f'{subdept} {number}' for subdept in dept.split('/'))
+            for alias in aliases:
+                code_index.setdefault(normalize_code(alias), []).append(row)
+        self.code_index = {code: np.array(rows) for code, rows in code_index.items()}
+
+    def __len__(self) -> int:
+        return len(self.courses)
+
+    def dept_mask(self, dept: str) -> np.ndarray:
+        '''
+        Mask for a department filter. Unknown departments fall back to a course code prefix
+        match, which is computed once per prefix.
+        '''
+        dept = dept.strip().upper()
+        if dept in self.dept_masks:
+            return self.dept_masks[dept]
+        if dept not in self._prefix_masks:
+            if len(self._prefix_masks) >= 1024:
+                self._prefix_masks.clear()
+            self._prefix_masks[dept] = np.char.startswith(self.codes, dept)
+        return self._prefix_masks[dept]
+
+    def mask(self, division: str = 'All Courses', dept: str = '') -> np.ndarray:
+        '''
+        Combine the division and department filters into one mask.
+        '''
+        mask = self.division_masks[division]
+        if dept:
+            mask = mask & self.dept_mask(dept)
+        return mask
+
+    def rows(self, mask: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(mask)
+
+    def code_rows(self, codes) -> np.ndarray:
+        '''
+        Rows of the courses with any of the given normalised codes, in catalog order.
+        '''
+        found = [self.code_index[code] for code in codes if code in self.code_index]
+        if not found:
+            return np.empty(0, dtype=int)
+        return np.unique(np.concatenate(found))
+
+    def filter_rows(self, division: str = 'All Courses', dept: str = '', codes=()) -> np.ndarray:
+        '''
+        Rows passing the division, department and course code filters. With course codes, only the
+        indexed rows of those codes are checked against the other filters.
+        '''
+        if not codes:
+            return self.rows(self.mask(division, dept))
+        rows = self.code_rows(codes)
+        keep = self.division_masks[division][rows]
+        if dept:
+            keep &= self.dept_mask(dept)[rows]
+        return rows[keep]
+
+    def select(self, rows) -> list:
+        return [self.courses[i] for i in rows]
+
+def build_snapshot() -> list:
+    '''
+    Consolidate the per-department course files into a single catalog snapshot.
+    '''
+    courses = []
+    for dept in os.listdir('data/courses'):
+        courses.extend(read_json(f'data/courses/{dept}'))
+    write_json(SNAPSHOT_PATH, courses)
+    return courses
+
+def load_snapshot() -> list:
+    '''
+    Load the course list from the catalog snapshot, building it on first use.
+    '''
+    if os.path.exists(SNAPSHOT_PATH):
+        return read_json(SNAPSHOT_PATH)
+    return build_snapshot()
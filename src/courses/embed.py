@@ -1,24 +1,155 @@
-import faiss
+import hashlib
+import os
+
 import numpy as np
 
-from ..const import MODEL, COURSES, INDEX
+from ..const import INDEX_BACKEND, SEARCH_TOP_K, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from ..metrics import METRICS
+from ..resources import RESOURCES
+from ..utils import LRUCache
+from .index import ID_SCHEME, build_index, course_ids, index_digest, save_index, prepare_queries, search_params
+from .model import model_tag
+
+EMBEDDING_CACHE = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+RESULT_CACHE = LRUCache(maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL)
+
+EMBEDDINGS_PATH = 'data/course_embeddings.npz'
+
+def description_hash(desc: str) -> str:
+    return hashlib.sha1(desc.encode('utf-8')).hexdigest()
+
+def load_embeddings() -> dict:
+    '''
+    Load stored description embeddings keyed by description hash. Embeddings made by a different
+    model are discarded.
+    '''
+    if not os.path.exists(EMBEDDINGS_PATH):
+        return {}
+    with np.load(EMBEDDINGS_PATH) as store:
+        if str(store['model']) != model_tag():
+            return {}
+        return dict(zip(store['hashes'].tolist(), store['vectors']))
+
+def save_embeddings(embeddings: dict) -> None:
+    with open(EMBEDDINGS_PATH + '.tmp', 'wb') as f:
+        np.savez(f, model=np.array(model_tag()), hashes=np.array(list(embeddings), dtype=str),
+                 vectors=np.stack(list(embeddings.values())))
+    os.replace(EMBEDDINGS_PATH + '.tmp', EMBEDDINGS_PATH)
 
-def embed():
+def embed(batch_size: int = 256, backend: str = INDEX_BACKEND, **params):
     '''
-    Generate embeddings and update the course catalog database.
+    Generate embeddings and update the course catalog database. Only descriptions that are new or
+    changed since the last run are encoded; the rest are reused from the embedding store. The index
+    is built with the given backend (see index.build_index) over stable course ids (see
+    index.course_ids), so vectors stay attached to their courses as the catalog changes, and
+    replaces the old index file atomically.
     '''
-    embeddings = MODEL.encode([course['desc'] for course in COURSES])
-    embeddings_np = np.array(embeddings).astype(np.float32)
+    RESOURCES.reload('courses', 'catalog', 'index_rows', 'lexical', 'prereqs')
+    courses = RESOURCES.courses
+    hashes = [description_hash(course['desc']) for course in courses]
+    stored = load_embeddings()
+    missing = {h: course['desc'] for h, course in zip(hashes, courses) if h not in stored}
+    print(f'[Embed] Encoding {len(missing)} of {len(courses)} course descriptions')
+    if missing:
+        encoded = RESOURCES.model.encode(list(missing.values()), batch_size=batch_size)
+        stored.update(zip(missing, np.array(encoded).astype(np.float32)))
+    embeddings = {h: stored[h] for h in hashes}
+    # one vector per course id, taken from the first row with that id
+    ids, rows = np.unique(course_ids(courses), return_index=True)
+    embeddings_np = np.stack([embeddings[hashes[row]] for row in rows])
+
+    index, meta = build_index(embeddings_np, ids, backend, **params)
+    meta.update({'model': model_tag(), 'ids': ID_SCHEME, 'catalog': index_digest(courses)})
+    save_index(index, meta)
+    save_embeddings(embeddings)
+    RESOURCES.set('index', index)
+    RESOURCES.set('index_meta', meta)
+    print(f'[Embed] Built {backend} index over {len(ids)} courses')
+    EMBEDDING_CACHE.clear()
+    RESULT_CACHE.clear()
 
-    index = faiss.IndexFlatL2(embeddings_np.shape[1])
-    index.add(embeddings_np)
-    faiss.write_index(index, "data/course_catalog.faiss")
+def normalize_query(query: str) -> str:
+    '''
+    Cache key for a query. The model is uncased, so case and spacing do not change the embedding.
+    '''
+    return ' '.join(query.lower().split())
 
-def query(query: str) -> list:
+def encode_queries(queries: list) -> np.ndarray:
     '''
-    Query a string to get list of relevant classes.
+    Embed a batch of queries, reusing cached embeddings and encoding all misses in one model call.
+    '''
+    keys = [normalize_query(query) for query in queries]
+    embeddings = [EMBEDDING_CACHE.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+    if missing:
+        model = RESOURCES.model
+        with METRICS.timer('search.encode'):
+            encoded = dict(zip(missing, np.array(model.encode(missing)).astype(np.float32)))
+        METRICS.inc('search.encoded', len(missing))
+        for key, embedding in encoded.items():
+            EMBEDDING_CACHE.put(key, embedding)
+        embeddings = [encoded[key] if embedding is None else embedding
+                      for key, embedding in zip(keys, embeddings)]
+    return np.stack(embeddings)
+
+METRICS.gauge('search.embedding_cache', EMBEDDING_CACHE.stats)
+METRICS.gauge('search.result_cache', RESULT_CACHE.stats)
+
+def search_rows(embeddings: np.ndarray, k: int = SEARCH_TOP_K, ids: list | None = None) -> list:
     '''
-    query_embedding = MODEL.encode([query])
-    _, I = INDEX.search(np.array(query_embedding).astype(np.float32), k=len(COURSES))
-    results = [COURSES[i] for i in I[0]]
-    return results
\ No newline at end of file
+    Get the catalog rows of the top k classes for each query embedding with a single index search,
+    optionally restricted to the catalog rows in ids. The restriction is pushed into FAISS as an ID
+    selector; if the index does not support selectors, the search is widened until enough allowed
+    rows survive the post-filter.
+    '''
+    index, meta, row_map = RESOURCES.index, RESOURCES.index_meta, RESOURCES.index_rows
+    with METRICS.timer('search.faiss'):
+        return _search_rows(index, meta, row_map, prepare_queries(embeddings, meta), k, ids)
+
+def _search_rows(index, meta: dict, row_map, embeddings: np.ndarray, k: int, rows) -> list:
+    def to_rows(I):
+        return [[row for row in found if row >= 0] for found in row_map.to_rows(I).tolist()]
+
+    if rows is None:
+        _, I = index.search(embeddings, k=min(k, index.ntotal), params=search_params(meta))
+        return to_rows(I)
+    if len(rows) == 0:
+        return [[] for _ in embeddings]
+
+    ids = row_map.to_ids(rows)
+    k = min(k, len(ids))
+    try:
+        _, I = index.search(embeddings, k=k, params=search_params(meta, ids))
+        # approximate backends can run out of candidates under a narrow filter
+        if (I >= 0).sum(axis=1).min() == k:
+            return to_rows(I)
+    except RuntimeError:
+        pass
+
+    allowed = set(ids.tolist())
+    width = k
+    while True:
+        width = min(width * 4, index.ntotal)
+        _, I = index.search(embeddings, k=width, params=search_params(meta))
+        results = [[i for i in found if i in allowed] for found in I.tolist()]
+        if all(len(found) >= k for found in results) or width == index.ntotal:
+            return [row_map.to_rows(found[:k]).tolist() for found in results]
+
+def search_embeddings(embeddings: np.ndarray, k: int = SEARCH_TOP_K, ids: list | None = None) -> list:
+    '''
+    Get the top k classes for each query embedding, see search_rows.
+    '''
+    courses = RESOURCES.courses
+    return [[courses[i] for i in row] for row in search_rows(embeddings, k, ids)]
+
+def query(query: str, k: int = SEARCH_TOP_K, ids: list | None = None) -> list:
+    '''
+    Query a string to get the top k relevant classes, optionally restricted to the catalog rows in
+    ids.
+    '''
+    return search_embeddings(encode_queries([query]), k, ids)[0]
+
+
+if __name__ == '__main__':
+    import sys
+    embed(backend=sys.argv[1] if len(sys.argv) > 1 else INDEX_BACKEND)
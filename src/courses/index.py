@@ -0,0 +1,182 @@
+from datetime import datetime
+import hashlib
+import json
+import math
+import os
+
+import faiss
+import numpy as np
+
+from ..utils import read_json, write_json
+from .catalog import normalize_code
+
+INDEX_PATH = 'data/course_catalog.faiss'
+INDEX_META_PATH = 'data/course_catalog.faiss.json'
+INDEX_BACKENDS = ('flat', 'flat_ip', 'hnsw', 'ivfpq')
+# how index ids are derived from courses, recorded so that indexes with other ids are rejected
+ID_SCHEME = 'code-sha1-63'
+
+def course_ids(courses: list) -> np.ndarray:
+    '''
+    Index id of each catalog row: the first 63 bits of the SHA-1 of its normalised course code. A
+    course keeps its id when other courses are added or removed, and copies of a cross-listed
+    course share one.
+    '''
+    return np.array([
+        int.from_bytes(hashlib.sha1(normalize_code(course['code']).encode('utf-8')).digest()[:8], 'big') >> 1
+        for course in courses
+    ], dtype=np.int64)
+
+def index_digest(courses: list) -> str:
+    '''
+    Hash of the indexed content, course codes and descriptions regardless of row order, used to
+    tell whether the index is up to date with the catalog.
+    '''
+    entries = sorted({(normalize_code(course['code']), course['desc']) for course in courses})
+    return hashlib.sha1(json.dumps(entries).encode('utf-8')).hexdigest()
+
+class RowMap:
+    '''
+    Translation between catalog rows and index ids. An id shared by several rows maps back to the
+    first of them, and ids of courses no longer in the catalog map to -1.
+    '''
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+        self.unique_ids, self.first_rows = np.unique(ids, return_index=True)
+
+    def to_ids(self, rows) -> np.ndarray:
+        return np.unique(self.ids[np.asarray(rows, dtype=np.int64)])
+
+    def to_rows(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.unique_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.unique_ids, ids), len(self.unique_ids) - 1)
+        return np.where(self.unique_ids[positions] == ids, self.first_rows[positions], -1)
+
+def _pq_subquantizers(dim: int) -> int:
+    '''
+    Largest number of PQ subquantizers that divides dim and keeps at least 8 dimensions each.
+    '''
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, backend: str = 'flat', **params) -> tuple:
+    '''
+    Build an index over vectors with the given backend, returning the index and the metadata
+    needed to query it:
+    - flat: exact L2 search
+    - flat_ip: exact inner product search on normalised vectors
+    - hnsw: HNSW graph on normalised vectors (params m, ef_construction, ef_search)
+    - ivfpq: inverted lists with product quantisation on normalised vectors (params nlist, m,
+      nbits, nprobe)
+    '''
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f'Unknown index backend {backend}, expected one of {INDEX_BACKENDS}')
+    n, dim = vectors.shape
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if backend == 'flat':
+        meta = {'metric': 'l2', 'params': {}}
+        inner = faiss.IndexFlatL2(dim)
+    else:
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+        meta = {'metric': 'ip'}
+    if backend == 'flat_ip':
+        meta['params'] = {}
+        inner = faiss.IndexFlatIP(dim)
+    elif backend == 'hnsw':
+        meta['params'] = {
+            'm': params.get('m', 32),
+            'ef_construction': params.get('ef_construction', 200),
+            'ef_search': params.get('ef_search', 128)
+        }
+        inner = faiss.IndexHNSWFlat(dim, meta['params']['m'], faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = meta['params']['ef_construction']
+    elif backend == 'ivfpq':
+        # faiss wants ~39 training points per list and 2**nbits points per PQ codebook
+        nlist = params.get('nlist', max(1, min(int(4 * math.sqrt(n)), n // 39)))
+        meta['params'] = {
+            'nlist': nlist,
+            'm': params.get('m', _pq_subquantizers(dim)),
+            'nbits': params.get('nbits', max(1, min(8, int(math.log2(max(n // 39, 2)))))),
+            'nprobe': params.get('nprobe', min(nlist, 16))
+        }
+        quantizer = faiss.IndexFlatIP(dim)
+        inner = faiss.IndexIVFPQ(quantizer, dim, nlist, meta['params']['m'], meta['params']['nbits'],
+                                 faiss.METRIC_INNER_PRODUCT)
+        inner.train(vectors)
+
+    index = faiss.IndexIDMap(inner)
+    index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    meta.update({
+        'backend': backend,
+        'dim': dim,
+        'count': n,
+        'built_at': datetime.now().isoformat(timespec='seconds')
+    })
+    return index, meta
+
+def save_index(index, meta: dict) -> None:
+    '''
+    Write the index and its metadata, replacing the previous files atomically.
+    '''
+    faiss.write_index(index, INDEX_PATH + '.tmp')
+    write_json(INDEX_META_PATH + '.tmp', meta)
+    os.replace(INDEX_PATH + '.tmp', INDEX_PATH)
+    os.replace(INDEX_META_PATH + '.tmp', INDEX_META_PATH)
+
+def load_index(meta: dict | None = None):
+    '''
+    Read the index, checking it against its metadata when given: an index and metadata from
+    different builds would map results wrongly.
+    '''
+    index = faiss.read_index(INDEX_PATH)
+    if meta is not None and (index.ntotal != meta.get('count') or index.d != meta.get('dim')):
+        raise ValueError(
+            f"{INDEX_PATH} holds {index.ntotal} vectors of dimension {index.d} but its metadata "
+            f"says {meta.get('count')} of dimension {meta.get('dim')}, rebuild it with python -m src.courses.embed"
+        )
+    return index
+
+def load_index_meta(digest: str | None = None, model: str | None = None) -> dict:
+    '''
+    Metadata of the built index, checked against the catalog digest and the tag of the model that
+    will encode queries (see model.model_tag):
+    - indexes whose ids are not stable course ids cannot be mapped to the catalog and are rejected
+    - indexes built with another model are rejected, their vectors are not comparable to queries
+    - indexes built with another backend of the same model, or from a different catalog, still
+      work but rank slightly differently or miss the catalog changes, so a warning is printed
+    '''
+    meta = read_json(INDEX_META_PATH) if os.path.exists(INDEX_META_PATH) else {}
+    rebuild = 'rebuild it with python -m src.courses.embed'
+    if meta.get('ids') != ID_SCHEME:
+        raise ValueError(f'{INDEX_PATH} does not use stable course ids, {rebuild}')
+    if model is not None and meta.get('model') != model:
+        built_with = meta.get('model') or 'an unknown model'
+        if built_with.split(':')[0] != model.split(':')[0]:
+            raise ValueError(f'{INDEX_PATH} was built with {built_with} but queries use {model}, {rebuild}')
+        print(f'[Index] {INDEX_PATH} was built with {built_with} but queries use {model}, {rebuild}')
+    if digest is not None and meta.get('catalog') != digest:
+        print(f'[Index] {INDEX_PATH} was built from a different catalog, {rebuild}')
+    return meta
+
+def prepare_queries(embeddings: np.ndarray, meta: dict) -> np.ndarray:
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if meta['metric'] == 'ip':
+        embeddings = embeddings.copy()
+        faiss.normalize_L2(embeddings)
+    return embeddings
+
+def search_params(meta: dict, ids: np.ndarray | None = None):
+    '''
+    Search parameters for the backend, restricted to ids if given.
+    '''
+    kwargs = {} if ids is None else {'sel': faiss.IDSelectorBatch(ids)}
+    if meta['backend'] == 'hnsw':
+        return faiss.SearchParametersHNSW(efSearch=meta['params']['ef_search'], **kwargs)
+    if meta['backend'] == 'ivfpq':
+        return faiss.SearchParametersIVF(nprobe=meta['params']['nprobe'], **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+LEXICAL_PATH = 'data/course_catalog.bm25.npz'
+
+# term frequencies are scaled per field, so a match in the code or title counts for more than one
+# in the description (which also holds the prerequisites)
+FIELD_WEIGHTS = {'code': 3.0, 'title': 2.0, 'desc': 1.0}
+
+_TOKEN = re.compile(r'[a-z]+|[0-9]+[a-z]*')
+
+def tokenize(text: str) -> list:
+    '''
+    Lowercase word and number tokens. A word followed by a number is also kept as one term, so
+    'CSE 100' and 'cse100' both match the course code exactly.
+    '''
+    words = _TOKEN.findall(text.lower())
+    return words + [a + b for a, b in zip(words, words[1:]) if a[0].isalpha() and b[0].isdigit()]
+
+def catalog_digest(courses: list) -> str:
+    '''
+    Hash of the indexed fields, used to tell whether a stored index matches the catalog.
+    '''
+    fields = [[course.get(field) or '' for field in FIELD_WEIGHTS] for course in courses]
+    return hashlib.sha1(json.dumps(fields).encode('utf-8')).hexdigest()
+
+class LexicalIndex:
+    '''
+    BM25 inverted index over the catalog in CSR form: the postings of term t are docs and weights
+    in indptr[t]:indptr[t + 1]. Each weight is the full BM25 contribution of the term to the
+    document, so a query is scored with one weighted bincount over its postings.
+    '''
+    def __init__(self, terms: np.ndarray, indptr: np.ndarray, docs: np.ndarray, weights: np.ndarray,
+                 count: int, digest: str = ''):
+        self.terms = terms
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.count = count
+        self.digest = digest
+        self.vocab = {term: i for i, term in enumerate(terms.tolist())}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def scores(self, query: str) -> np.ndarray:
+        '''
+        BM25 score of every catalog row for the query.
+        '''
+        term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+        if not term_ids:
+            return np.zeros(self.count, dtype=np.float32)
+        postings = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        return np.bincount(
+            np.concatenate([self.docs[p] for p in postings]),
+            weights=np.concatenate([self.weights[p] for p in postings]),
+            minlength=self.count
+        ).astype(np.float32)
+
+    def search(self, query: str, k: int, ids=None) -> list:
+        '''
+        Catalog rows of the top k matches for the query, best first, optionally restricted to the
+        rows in ids. Rows that share no term with the query are never returned.
+        '''
+        scores = self.scores(query)
+        rows = np.flatnonzero(scores) if ids is None else np.asarray(ids, dtype=np.int64)
+        rows = rows[scores[rows] > 0]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        # stable sort keeps catalog order between equal scores
+        return rows[np.argsort(-scores[rows], kind='stable')].tolist()
+
+def build_lexical_index(courses: list, k1: float = 1.2, b: float = 0.75) -> LexicalIndex:
+    '''
+    Build the BM25 index over course codes, titles and descriptions.
+    '''
+    counts = []
+    for course in courses:
+        tf = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(course.get(field) or ''):
+                tf[term] = tf.get(term, 0.0) + weight
+        counts.append(tf)
+    lengths = np.array([sum(tf.values()) for tf in counts], dtype=np.float32)
+    avg_length = float(lengths.mean()) if len(courses) else 1.0
+
+    postings = {}
+    for doc, tf in enumerate(counts):
+        for term, freq in tf.items():
+            postings.setdefault(term, []).append((doc, freq))
+
+    terms = sorted(postings)
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    docs, weights = [], []
+    for t, term in enumerate(terms):
+        doc_ids, freqs = zip(*postings[term])
+        doc_ids, freqs = np.array(doc_ids, dtype=np.int32), np.array(freqs, dtype=np.float32)
+        idf = np.log(1 + (len(courses) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+        norm = k1 * (1 - b + b * lengths[doc_ids] / avg_length)
+        docs.append(doc_ids)
+        weights.append((idf * freqs * (k1 + 1) / (freqs + norm)).astype(np.float32))
+        indptr[t + 1] = indptr[t] + len(doc_ids)
+    return LexicalIndex(
+        np.array(terms, dtype=str), indptr,
+        np.concatenate(docs) if docs else np.empty(0, dtype=np.int32),
+        np.concatenate(weights) if weights else np.empty(0, dtype=np.float32),
+        len(courses), catalog_digest(courses)
+    )
+
+def save_lexical_index(index: LexicalIndex) -> None:
+    with open(LEXICAL_PATH + '.tmp', 'wb') as f:
+        np.savez_compressed(f, terms=index.terms, indptr=index.indptr, docs=index.docs,
+                            weights=index.weights, count=np.array(index.count),
+                            digest=np.array(index.digest))
+    os.replace(LEXICAL_PATH + '.tmp', LEXICAL_PATH)
+
+def load_lexical_index(courses: list) -> LexicalIndex:
+    '''
+    Load the stored BM25 index, rebuilding and storing it if it is missing or was built from a
+    different catalog.
+    '''
+    digest = catalog_digest(courses)
+    if os.path.exists(LEXICAL_PATH):
+        with np.load(LEXICAL_PATH) as store:
+            if str(store['digest']) == digest:
+                return LexicalIndex(store['terms'], store['indptr'], store['docs'], store['weights'],
+                                    int(store['count']), digest)
+    index = build_lexical_index(courses)
+    save_lexical_index(index)
+    return index
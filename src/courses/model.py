@@ -0,0 +1,94 @@
+import sys
+
+import numpy as np
+
+from ..const import MODEL_NAME, MODEL_BACKEND
+from .catalog import load_snapshot
+
+MODEL_BACKENDS = ('torch', 'torch_int8', 'onnx', 'onnx_int8')
+# int8 export shipped in the model repository; the avx512 variants are faster where supported
+ONNX_INT8_FILE = 'onnx/model_quint8_avx2.onnx'
+MIN_AGREEMENT = 0.9
+
+def model_tag(backend: str = MODEL_BACKEND) -> str:
+    '''
+    Name stored with catalog embeddings and the index. Backends other than torch produce slightly
+    different vectors, so the catalog is re-encoded when the backend changes.
+    '''
+    return MODEL_NAME if backend == 'torch' else f'{MODEL_NAME}:{backend}'
+
+def load_model(backend: str = MODEL_BACKEND):
+    '''
+    Load the embedding model for CPU inference with the given backend:
+    - torch: full precision PyTorch
+    - torch_int8: PyTorch with dynamically quantised int8 linear layers
+    - onnx: ONNX Runtime (needs optimum and onnxruntime)
+    - onnx_int8: ONNX Runtime with the int8 quantised export
+    '''
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f'Unknown model backend {backend}, expected one of {MODEL_BACKENDS}')
+    from sentence_transformers import SentenceTransformer
+    if backend == 'onnx':
+        return SentenceTransformer(MODEL_NAME, device='cpu', backend='onnx')
+    if backend == 'onnx_int8':
+        return SentenceTransformer(MODEL_NAME, device='cpu', backend='onnx',
+                                   model_kwargs={'file_name': ONNX_INT8_FILE})
+    model = SentenceTransformer(MODEL_NAME, device='cpu')
+    if backend == 'torch_int8':
+        import torch
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+def encode(model, texts: list, batch_size: int = 256) -> np.ndarray:
+    return np.array(model.encode(texts, batch_size=batch_size)).astype(np.float32)
+
+def ranking_agreement(reference: np.ndarray, candidate: np.ndarray, queries: np.ndarray,
+                      candidate_queries: np.ndarray, k: int = 10) -> dict:
+    '''
+    Compare the rankings of the catalog produced by two models for the same queries: the overlap
+    of their top k, how often the best match is the same, and the cosine similarity of the two
+    models' catalog vectors.
+    '''
+    def top_k(catalog, queries, chunk=512):
+        catalog = catalog / np.linalg.norm(catalog, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        return np.concatenate([
+            np.argsort(-(queries[i:i + chunk] @ catalog.T), axis=1, kind='stable')[:, :k]
+            for i in range(0, len(queries), chunk)
+        ])
+
+    expected, found = top_k(reference, queries), top_k(candidate, candidate_queries)
+    cosine = np.sum(reference * candidate, axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        f'overlap@{k}': float(np.mean([len(set(e) & set(f)) / k for e, f in zip(expected, found)])),
+        'top1': float(np.mean(expected[:, 0] == found[:, 0])),
+        'mean_cosine': float(cosine.mean()),
+        'min_cosine': float(cosine.min())
+    }
+
+def validate(backend: str, queries: list | None = None, k: int = 10) -> dict:
+    '''
+    Check that a backend ranks the catalog like the full precision model. The catalog descriptions
+    are encoded with both models and ranked for each query; course titles are used as queries when
+    none are given.
+    '''
+    courses = load_snapshot()
+    descriptions = [course['desc'] for course in courses]
+    queries = queries or [course['title'] for course in courses]
+    reference, candidate = load_model('torch'), load_model(backend)
+    results = ranking_agreement(
+        encode(reference, descriptions), encode(candidate, descriptions),
+        encode(reference, queries), encode(candidate, queries), k
+    )
+    results.update({'backend': backend, 'queries': len(queries), 'catalog_size': len(courses),
+                    'passed': results[f'overlap@{k}'] >= MIN_AGREEMENT})
+    return results
+
+
+if __name__ == '__main__':
+    result = validate(sys.argv[1] if len(sys.argv) > 1 else MODEL_BACKEND)
+    for name, value in result.items():
+        print(f'{name}: {value}')
+    sys.exit(0 if result['passed'] else 1)
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from .catalog import normalize_code
+
+PREREQS_PATH = 'data/course_prereqs.npz'
+
+_CODE = re.compile(r'\b([A-Z]{2,5})\s*([0-9]{1,3}[A-Z]{0,2})\b')
+_NUMBER = re.compile(r'^\s*([0-9]{1,3}[A-Z]{0,2})\b')
+# restrictions, recommendations and credit exclusions run to the end of their clause, and any
+# codes in them are majors or courses that are not required
+_NOT_PREREQS_TAIL = re.compile(r'restrict|recommend|credit', re.IGNORECASE)
+# alternatives such as 'graduate standing' or 'concurrent enrollment in MATH 18' that are not
+# courses to take first
+_NOT_PREREQS = re.compile(r'major|standing|concurrent', re.IGNORECASE)
+
+def _codes(text: str, dept: str) -> tuple:
+    '''
+    Course codes in a piece of prerequisite text, as normalised codes. Bare numbers such as the
+    '20B' in 'MATH 20A or 20B' take the department of the code before them.
+    '''
+    codes = []
+    for part in re.split(r',|\bor\b', text):
+        match = _CODE.search(part)
+        if match:
+            dept = match.group(1)
+            codes.extend(normalize_code(f'{d} {n}') for d, n in _CODE.findall(part))
+        elif dept and (match := _NUMBER.match(part)):
+            codes.append(normalize_code(f'{dept} {match.group(1)}'))
+    return tuple(dict.fromkeys(codes)), dept
+
+def _course_text(segment: str) -> str:
+    '''
+    A clause of prerequisite text with the parts that are not courses to take first removed.
+    '''
+    if (match := _NOT_PREREQS_TAIL.search(segment)):
+        segment = segment[:match.start()]
+    parts = re.split(r'(,|\bor\b|\band\b)', segment)
+    return ''.join('' if _NOT_PREREQS.search(part) else part for part in parts)
+
+def parse_prereqs(text: str) -> list:
+    '''
+    Parse prerequisite text into conjunctive normal form: a list of clauses that must all hold,
+    each a tuple of course codes of which any one is enough.
+    - ';' and 'and' separate clauses
+    - a comma separated list is one clause if it contains 'or', and one clause per code otherwise
+    Restrictions, recommendations and credit exclusions are cut from their clause, and
+    alternatives about majors, standing or concurrent enrollment are dropped, keeping the course
+    codes around them. Alternatives that are not courses, such as consent of instructor, are
+    ignored, so a course is only treated as open when its course requirements are met.
+    '''
+    if not text or text.strip() == 'None':
+        return []
+    text = '; '.join(
+        _course_text(segment)
+        for sentence in re.split(r'\.\s', text.split('Prerequisites:')[-1])
+        for segment in sentence.split(';')
+    )
+    clauses = []
+    dept = ''
+    for segment in re.split(r';|\band\b', text):
+        if re.search(r'\bor\b', segment):
+            options, dept = _codes(segment, dept)
+            if options:
+                clauses.append(options)
+            continue
+        for part in segment.split(','):
+            options, dept = _codes(part, dept)
+            clauses.extend((code,) for code in options)
+    return list(dict.fromkeys(clauses))
+
+def prereqs_digest(courses: list) -> str:
+    return hashlib.sha1(
+        json.dumps([[course['code'], course.get('prereqs')] for course in courses]).encode('utf-8')
+    ).hexdigest()
+
+class PrereqGraph:
+    '''
+    Prerequisite AND/OR graph in adjacency arrays. Course codes are interned to node ids (the
+    departments of a cross-listed course share one node). Course node n requires the clauses
+    clauses[course_ptr[n]:course_ptr[n + 1]], and clause c is satisfied by any of the nodes in
+    options[clause_ptr[c]:clause_ptr[c + 1]]. Identical clauses are stored once, so evaluating a
+    clause for one user serves every course that shares it.
+    '''
+    def __init__(self, codes: np.ndarray, aliases: dict, course_ptr: np.ndarray, clauses: np.ndarray,
+                 clause_ptr: np.ndarray, options: np.ndarray, digest: str = ''):
+        self.codes = codes
+        self.aliases = aliases
+        self.course_ptr = course_ptr
+        self.clauses = clauses
+        self.clause_ptr = clause_ptr
+        self.options = options
+        self.digest = digest
+        # (clause, option) pairs for evaluating every clause at once
+        self.option_clause = np.repeat(np.arange(len(clause_ptr) - 1), np.diff(clause_ptr))
+        self.clause_course = np.repeat(np.arange(len(course_ptr) - 1), np.diff(course_ptr))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def node(self, code: str):
+        return self.aliases.get(normalize_code(code))
+
+    def requirements(self, code: str) -> list:
+        '''
+        The prerequisite clauses of a course as lists of course codes.
+        '''
+        node = self.node(code)
+        if node is None:
+            return []
+        return [
+            [str(self.codes[o]) for o in self.options[self.clause_ptr[c]:self.clause_ptr[c + 1]]]
+            for c in self.clauses[self.course_ptr[node]:self.course_ptr[node + 1]]
+        ]
+
+    def completed_matrix(self, completed: list) -> np.ndarray:
+        '''
+        Boolean (users, nodes) matrix of the completed courses of each user.
+        '''
+        matrix = np.zeros((len(completed), len(self.codes)), dtype=bool)
+        for row, codes in enumerate(completed):
+            nodes = [node for node in map(self.node, codes) if node is not None]
+            matrix[row, nodes] = True
+        return matrix
+
+    def open_courses(self, completed: np.ndarray) -> np.ndarray:
+        '''
+        Boolean (users, nodes) matrix of the courses whose prerequisites each user has met. Each
+        distinct clause is evaluated once per user, and a course is open when none of its clauses
+        fails.
+        '''
+        users = len(completed)
+        satisfied = np.zeros((users, len(self.clause_ptr) - 1), dtype=bool)
+        if len(self.options):
+            hits = completed[:, self.options]
+            rows, cols = np.nonzero(hits)
+            satisfied[rows, self.option_clause[cols]] = True
+        failed = np.zeros((users, len(self.codes)), dtype=bool)
+        if len(self.clauses):
+            rows, cols = np.nonzero(~satisfied[:, self.clauses])
+            failed[rows, self.clause_course[cols]] = True
+        return ~failed
+
+    def eligible(self, progress: list, chunk: int = 1024) -> list:
+        '''
+        For each (completed, candidates) pair, the candidate courses that are not completed and
+        whose prerequisites are met by the completed courses, in candidate order. Courses without
+        known prerequisites are always open. Users are evaluated in chunks of one matrix each.
+        '''
+        results = []
+        for start in range(0, len(progress), chunk):
+            batch = progress[start:start + chunk]
+            completed = self.completed_matrix([codes for codes, _ in batch])
+            open_courses = self.open_courses(completed)
+            for row, (codes, candidates) in enumerate(batch):
+                done = {normalize_code(code) for code in codes}
+                results.append([
+                    code for code in dict.fromkeys(candidates)
+                    if normalize_code(code) not in done
+                    and ((node := self.node(code)) is None or
+                         (open_courses[row, node] and not completed[row, node]))
+                ])
+        return results
+
+def build_prereq_graph(courses: list) -> PrereqGraph:
+    '''
+    Parse the prerequisites of every catalog course into a PrereqGraph.
+    '''
+    aliases, codes = {}, []
+    def intern(code):
+        if code not in aliases:
+            aliases[code] = len(codes)
+            codes.append(code)
+        return aliases[code]
+
+    for course in courses:
+        dept, _, number = course['code'].rpartition(' ')
+        node = intern(normalize_code(course['code']))
+        for subdept in dept.split('/') if dept else ():
+            aliases.setdefault(normalize_code(f'{subdept} {number}'), node)
+    requirements = {}
+    for course in courses:
+        node = aliases[normalize_code(course['code'])]
+        requirements.setdefault(node, parse_prereqs(course.get('prereqs')))
+
+    clause_ids = {}
+    course_clauses = {
+        node: [clause_ids.setdefault(tuple(intern(code) for code in clause), len(clause_ids))
+               for clause in clauses]
+        for node, clauses in requirements.items()
+    }
+    course_ptr = np.zeros(len(codes) + 1, dtype=np.int32)
+    clauses = []
+    for node in range(len(codes)):
+        clauses.extend(course_clauses.get(node, ()))
+        course_ptr[node + 1] = len(clauses)
+    clause_ptr = np.zeros(len(clause_ids) + 1, dtype=np.int32)
+    options = []
+    for clause, i in clause_ids.items():
+        options.extend(clause)
+        clause_ptr[i + 1] = len(options)
+    return PrereqGraph(np.array(codes, dtype=str), aliases, course_ptr, np.array(clauses, dtype=np.int32),
+                       clause_ptr, np.array(options, dtype=np.int32), prereqs_digest(courses))
+
+def save_prereq_graph(graph: PrereqGraph) -> None:
+    alias_codes = np.array(list(graph.aliases), dtype=str)
+    alias_nodes = np.array(list(graph.aliases.values()), dtype=np.int32)
+    with open(PREREQS_PATH + '.tmp', 'wb') as f:
+        np.savez_compressed(f, codes=graph.codes, alias_codes=alias_codes, alias_nodes=alias_nodes,
+                            course_ptr=graph.course_ptr, clauses=graph.clauses,
+                            clause_ptr=graph.clause_ptr, options=graph.options,
+                            digest=np.array(graph.digest))
+    os.replace(PREREQS_PATH + '.tmp', PREREQS_PATH)
+
+def load_prereq_graph(courses: list) -> PrereqGraph:
+    '''
+    Load the stored prerequisite graph, rebuilding and storing it if it is missing or was built
+    from different prerequisites.
+    '''
+    digest = prereqs_digest(courses)
+    if os.path.exists(PREREQS_PATH):
+        with np.load(PREREQS_PATH) as store:
+            if str(store['digest']) == digest:
+                return PrereqGraph(
+                    store['codes'], dict(zip(store['alias_codes'].tolist(), store['alias_nodes'].tolist())),
+                    store['course_ptr'], store['clauses'], store['clause_ptr'], store['options'], digest
+                )
+    graph = build_prereq_graph(courses)
+    save_prereq_graph(graph)
+    return graph
@@ -1,20 +1,41 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import json
 from urllib.parse import urljoin
 import os
 from datetime import datetime, timedelta as td
 
 from ..const import ALPHABET
+from ..utils import read_json, write_json
+from .catalog import build_snapshot
+from .prereqs import build_prereq_graph, save_prereq_graph
 
-def scrape(url):
+CATALOG_URL = "https://catalog.ucsd.edu/front/courses.html"
+CACHE_PATH = 'data/scrape_cache.json'
+COURSES_DIR = 'data/courses'
+# marine biology conservation grad electives, which is not a class
+SKIPPED_DEPARTMENTS = {'12'}
+
+def make_session(workers: int = 8) -> requests.Session:
     '''
-    Scrape course listing page for given link.
+    HTTP session with a connection pool large enough for every scraping worker.
     '''
-    print(f"Loading {url}")
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers,
+                          max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504)))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def parse(html: str) -> dict:
+    '''
+    Parse a course listing page into lists of courses keyed by department.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
 
     courses = defaultdict(list)
 
@@ -56,9 +77,43 @@ def scrape(url):
                 "desc": course_desc,
                 "prereqs": prereqs
             })
-    for subdept in courses:
-        with open(f'data/courses/{subdept}.json', 'w', encoding='utf-8') as f:
-            json.dump(courses[subdept], f, indent=4)
+    return dict(courses)
+
+def scrape(url: str, session: requests.Session | None = None, cached: dict | None = None) -> dict | None:
+    '''
+    Scrape course listing page for given link. If the cached entry from a previous scrape is given,
+    the page is requested conditionally and None is returned when it has not changed.
+    '''
+    print(f"Loading {url}")
+    headers = {}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+    response = (session or requests).get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'courses': parse(response.text)
+    }
+
+def write_departments(courses: dict, courses_dir: str = COURSES_DIR) -> list:
+    '''
+    Write department course files, skipping departments whose courses have not changed.
+    '''
+    os.makedirs(courses_dir, exist_ok=True)
+    changed = []
+    for subdept, listing in courses.items():
+        path = f'{courses_dir}/{subdept}.json'
+        if os.path.exists(path) and read_json(path) == listing:
+            continue
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(listing, f, indent=4)
+        changed.append(subdept)
+    return changed
 
 def scrape_enrollment_calendar(year: int):
     url = f'https://blink.ucsd.edu/instructors/courses/enrollment/calendars/20{year}.html'
@@ -113,20 +168,67 @@ def scrape_enrollment_calendar(year: int):
         json.dump(data, f, indent=4)
     
 
-def scrape_all():
-    base_url = "https://catalog.ucsd.edu/front/courses.html"
-    response = requests.get(base_url)
+def scrape_all(
+    base_url: str = CATALOG_URL,
+    workers: int = 8,
+    cache_path: str = CACHE_PATH,
+    courses_dir: str = COURSES_DIR,
+    rebuild: bool = True
+) -> list:
+    '''
+    Scrape every department page concurrently and rewrite only the departments that changed.
+    Pages that are unchanged since the last scrape, or that fail to load, reuse their cached
+    courses. If anything changed and rebuild is set, the catalog snapshot and the parsed
+    prerequisite graph are rebuilt from the default course files. Returns the list of updated
+    departments.
+
+    Scrapes of a stand-in server should pass their own cache_path and courses_dir and turn rebuild
+    off, so the real catalog data is left alone.
+    '''
+    session = make_session(workers)
+    response = session.get(base_url, timeout=30)
     soup = BeautifulSoup(response.text, 'html.parser')
     course_links = []
     for link in soup.find_all('a', href=True):
         href = link['href']
-        print(href)
         if href.startswith("../courses/"):
             full_url = urljoin(base_url, href)
             course_links.append(full_url)
-    print("Found course links:", course_links)
+    course_links = list(dict.fromkeys(course_links))
+    print(f"Found {len(course_links)} course links")
+
+    cache = read_json(cache_path) if os.path.exists(cache_path) else {}
+    def fetch(link):
+        try:
+            return link, scrape(link, session, cache.get(link))
+        except requests.RequestException as e:
+            print(f"Failed to load {link}: {e}")
+            return link, None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(pool.map(fetch, course_links))
+
+    courses = defaultdict(list)
+    seen = defaultdict(set)
     for link in course_links:
-        scrape(link)
-    
-    # remove marine biology conservation grad electives that is not a class    
-    os.remove('data/courses/12.json')
\ No newline at end of file
+        entry = results[link] or cache.get(link)
+        if entry is None:
+            continue
+        cache[link] = entry
+        for subdept, listing in entry['courses'].items():
+            if subdept in SKIPPED_DEPARTMENTS:
+                continue
+            for course in listing:
+                if course['code'] not in seen[subdept]:
+                    seen[subdept].add(course['code'])
+                    courses[subdept].append(course)
+
+    changed = write_departments(courses, courses_dir)
+    write_json(cache_path, cache)
+    print(f"Updated {len(changed)} departments: {', '.join(changed)}")
+    if changed and rebuild:
+        save_prereq_graph(build_prereq_graph(build_snapshot()))
+    return changed
+
+if __name__ == '__main__':
+    import sys
+    scrape_all(*sys.argv[1:2])
@@ -1,113 +1,466 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
 import sqlite3
 import json
+import threading
+
+# overridable so that load tests can run a server against a scratch database
+DB_PATH = os.environ.get('TRITONTHINK_DB', 'data/users.db')
+BUSY_TIMEOUT = 5.0
+
+_local = threading.local()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='db')
+
+def connect() -> sqlite3.Connection:
+    '''
+    Get the connection for the current thread. Each thread keeps one connection open, in WAL mode
+    so that the bot can read while the audit server writes, with a busy timeout instead of
+    failing on a locked database. Compiled statements are reused from the connection's statement
+    cache.
+    '''
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, cached_statements=128)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}')
+        conn.execute('PRAGMA foreign_keys=ON')
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+def close() -> None:
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+async def run(func, *args):
+    '''
+    Run a database function on the database thread pool, for use from the bot's event loop.
+    '''
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
 
 def init_db():
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        pid TEXT UNIQUE NOT NULL,
-        discord_user_id TEXT UNIQUE NOT NULL,
-        verified BOOLEAN DEFAULT 0,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        json_data TEXT
-    )
-    ''')
+    conn = connect()
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pid TEXT UNIQUE NOT NULL,
+            discord_user_id TEXT UNIQUE NOT NULL,
+            verified BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            json_data TEXT
+        )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+        # hashes of the last uploaded audit and of its parsed contents, for skipping repeat uploads
+        for column, kind in (('audit_hash', 'TEXT'), ('json_hash', 'TEXT'), ('earned_units', 'REAL'),
+                             ('wip_units', 'REAL')):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE users ADD COLUMN {column} {kind}')
+        conn.execute('CREATE INDEX IF NOT EXISTS users_audit_hash ON users (audit_hash)')
+        # enrollment pass a user asked to be reminded of, or 'all'
+        if 'reminder_pass' not in columns:
+            conn.execute('ALTER TABLE users ADD COLUMN reminder_pass TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS users_reminder_pass ON users (reminder_pass)')
+
+        # audits are stored as majors > categories > subrequirements > courses
+        conn.executescript('''
+        CREATE TABLE IF NOT EXISTS majors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            slot TEXT NOT NULL,
+            title TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS majors_user ON majors (user_id);
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            major_id INTEGER NOT NULL REFERENCES majors (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            title TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS categories_major ON categories (major_id);
+        CREATE TABLE IF NOT EXISTS subreqs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER NOT NULL REFERENCES categories (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            progress_type TEXT NOT NULL,
+            remaining REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS subreqs_category ON subreqs (category_id);
+        CREATE TABLE IF NOT EXISTS subreq_courses (
+            subreq_id INTEGER NOT NULL REFERENCES subreqs (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            completed BOOLEAN NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS subreq_courses_subreq ON subreq_courses (subreq_id);
+        CREATE INDEX IF NOT EXISTS subreq_courses_code ON subreq_courses (code, completed);
+        CREATE TABLE IF NOT EXISTS legacy_audits (
+            user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+            json_data TEXT NOT NULL
+        );
+        ''')
+    migrate_json_data()
 
-    conn.commit()
-    conn.close()
+def migrate_json_data():
+    '''
+    Move audits stored as users.json_data blobs into the audit tables, keeping the blobs in
+    legacy_audits. Each audit is moved in its own transaction; one that is not a valid audit is
+    skipped and left in users.json_data.
+    '''
+    conn = connect()
+    rows = conn.execute('SELECT id, json_data FROM users WHERE json_data IS NOT NULL').fetchall()
+    if not rows:
+        return
+    migrated = 0
+    for user_id, json_data in rows:
+        try:
+            with conn:
+                audit = json.loads(json_data)
+                json_string = json.dumps(audit, sort_keys=True)
+                conn.execute(
+                    'INSERT OR REPLACE INTO legacy_audits (user_id, json_data) VALUES (?, ?)',
+                    (user_id, json_data)
+                )
+                conn.execute('''
+                UPDATE users
+                SET json_data = NULL, json_hash = ?, earned_units = ?, wip_units = ?
+                WHERE id = ?
+                ''', (hashlib.sha256(json_string.encode()).hexdigest(), audit.get('earned_units'),
+                      audit.get('wip_units'), user_id))
+                _store_audit(conn, user_id, audit)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            print(f"[Database] Skipped the audit of user {user_id}, which is not a valid audit: {e!r}")
+            continue
+        migrated += 1
+    print(f"[Database] Migrated {migrated} of {len(rows)} audits to the audit tables")
 
 def link_pid(discord_user_id, pid):
     try:
-        conn = sqlite3.connect('data/users.db')
-        cursor = conn.cursor()
+        with connect() as conn:
+            conn.execute('''
+            INSERT INTO users (discord_user_id, pid)
+            VALUES (?, ?)
+            ''', (discord_user_id, pid))
+        print(f"Discord User {discord_user_id} linked with PID {pid}!")
+    except sqlite3.IntegrityError as e:
+        print(f"Error: {e}")
 
-        cursor.execute('''
+def link_or_update_pid(discord_user_id, pid):
+    '''
+    Link a PID to a Discord user, replacing any PID they linked before. Raises
+    sqlite3.IntegrityError if the PID is linked to another user. A new PID is unverified until an
+    audit for it is uploaded; linking the same PID again changes nothing.
+    '''
+    with connect() as conn:
+        # an audit stored for the previous PID no longer applies
+        conn.execute('''
+        DELETE FROM majors WHERE user_id = (SELECT id FROM users WHERE discord_user_id = ? AND pid != ?)
+        ''', (discord_user_id, pid))
+        conn.execute('''
         INSERT INTO users (discord_user_id, pid)
         VALUES (?, ?)
+        ON CONFLICT(discord_user_id) DO UPDATE SET
+            pid=excluded.pid, verified=0, audit_hash=NULL, json_hash=NULL, earned_units=NULL,
+            wip_units=NULL
+        WHERE users.pid != excluded.pid
         ''', (discord_user_id, pid))
 
-        conn.commit()
-        print(f"Discord User {discord_user_id} linked with PID {pid}!")
-    except sqlite3.IntegrityError as e:
-        print(f"Error: {e}")
-    finally:
-        conn.close()
-
 def get_user(discord_user_id=None, pid=None):
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
-    
     if discord_user_id:
-        cursor.execute('SELECT * FROM users WHERE discord_user_id = ?', (discord_user_id,))
+        cursor = connect().execute('SELECT * FROM users WHERE discord_user_id = ?', (discord_user_id,))
     elif pid:
-        cursor.execute('SELECT * FROM users WHERE pid = ?', (pid,))
-    
-    user = cursor.fetchone()
-    conn.close()
-    return user
+        cursor = connect().execute('SELECT * FROM users WHERE pid = ?', (pid,))
+    else:
+        return None
+    return cursor.fetchone()
 
 def delete_user(discord_user_id: int) -> None:
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM users WHERE discord_user_id = ?', (discord_user_id,))
-    conn.commit()
-    conn.close()
+    with connect() as conn:
+        conn.execute('DELETE FROM users WHERE discord_user_id = ?', (discord_user_id,))
 
 def check_user_exists(discord_user_id: int):
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT verified FROM users WHERE discord_user_id = ?', (discord_user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return True if user else False
+    cursor = connect().execute('SELECT verified FROM users WHERE discord_user_id = ?', (discord_user_id,))
+    return cursor.fetchone() is not None
 
 def check_user_verified(discord_user_id: int):
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
-
-    cursor.execute('SELECT verified FROM users WHERE discord_user_id = ?', (discord_user_id,))
+    cursor = connect().execute('SELECT verified FROM users WHERE discord_user_id = ?', (discord_user_id,))
     user = cursor.fetchone()
-    conn.close()
     if user:
         return user[0] == 1
     return False
 
-def insert_or_update_user(pid, json_data):
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
+def check_user_has_audit(discord_user_id) -> bool:
+    '''
+    Whether a user is verified and has an audit stored, even one without any courses listed.
+    '''
+    cursor = connect().execute(
+        'SELECT 1 FROM users WHERE discord_user_id = ? AND verified = 1 AND json_hash IS NOT NULL',
+        (str(discord_user_id),)
+    )
+    return cursor.fetchone() is not None
 
-    json_string = json.dumps(json_data)
-    cursor.execute('SELECT verified FROM users WHERE pid = ?', (pid,))
-    user = cursor.fetchone()
+def set_reminder_pass(discord_user_id, reminder_pass) -> bool:
+    '''
+    Set the enrollment pass a user is reminded of, or None to stop reminders. Returns False if the
+    user is not linked.
+    '''
+    with connect() as conn:
+        return conn.execute(
+            'UPDATE users SET reminder_pass = ? WHERE discord_user_id = ?', (reminder_pass, discord_user_id)
+        ).rowcount > 0
 
-    if user:
-        cursor.execute('''
-        UPDATE users 
-        SET json_data = ?, verified = 1 
-        WHERE pid = ?
-        ''', (json_string, pid))
+def get_reminder_recipients(passes: list) -> dict:
+    '''
+    Verified users to remind of any of the given enrollment passes, as {pass: [discord_user_id]}.
+    Users reminded of every pass are listed under 'all'.
+    '''
+    passes = list(passes) + ['all']
+    recipients = {}
+    for discord_user_id, reminder_pass in connect().execute(
+        f"SELECT discord_user_id, reminder_pass FROM users WHERE verified = 1 AND reminder_pass IN ({', '.join('?' * len(passes))})",
+        passes
+    ):
+        recipients.setdefault(reminder_pass, []).append(discord_user_id)
+    return recipients
 
-    conn.commit()
-    conn.close()
+def get_verified_users(discord_user_ids: list) -> set:
+    '''
+    The subset of the given users that are verified, checked in as few queries as possible.
+    '''
+    verified = set()
+    for i in range(0, len(discord_user_ids), 500):
+        chunk = discord_user_ids[i:i+500]
+        cursor = connect().execute(
+            f"SELECT discord_user_id FROM users WHERE verified = 1 AND discord_user_id IN ({', '.join('?' * len(chunk))})",
+            chunk
+        )
+        verified.update(row[0] for row in cursor)
+    return verified
 
-def get_json_data(discord_user_id):
-    conn = sqlite3.connect('data/users.db')
-    cursor = conn.cursor()
+def get_audit_versions(discord_user_ids: list) -> dict:
+    '''
+    The stored audit version (the json hash) of each of the given users, None for users without an
+    audit. Users that are not linked are left out.
+    '''
+    versions = {}
+    for i in range(0, len(discord_user_ids), 500):
+        chunk = discord_user_ids[i:i+500]
+        versions.update(connect().execute(
+            f"SELECT discord_user_id, json_hash FROM users WHERE discord_user_id IN ({', '.join('?' * len(chunk))})",
+            chunk
+        ))
+    return versions
 
-    # Query to retrieve the json_data for the given discord_user_id
-    cursor.execute('SELECT json_data FROM users WHERE discord_user_id = ?', (discord_user_id,))
-    result = cursor.fetchone()
+def find_audit(audit_hash: str):
+    '''
+    The (pid, discord_user_id, json_hash) of the verified user whose last uploaded audit has this
+    hash, if any.
+    '''
+    return connect().execute(
+        'SELECT pid, discord_user_id, json_hash FROM users WHERE audit_hash = ? AND verified = 1',
+        (audit_hash,)
+    ).fetchone()
 
-    if result:
-        json_data_str = result[0]
-        try:
-            json_data = json.loads(json_data_str)
-            return json_data
-        except:
-            return None
+def insert_or_update_user(pid, json_data, audit_hash=None):
+    '''
+    Store an audit for a linked PID and mark it verified. Returns the linked Discord user id and the
+    stored audit version, or None if the PID is not linked.
+    '''
+    return insert_or_update_users([(pid, json_data, audit_hash)])[0]
+
+def insert_or_update_users(audits: list) -> list:
+    '''
+    Store several (pid, json_data, audit_hash) audits in one transaction, returning the linked
+    (discord_user_id, json_hash) for each, or None where the PID is not linked. The json hash is the
+    version of the stored audit. If the parsed audit is the same as the stored one, only the upload
+    hash is updated.
+    '''
+    stored = []
+    with connect() as conn:
+        for pid, json_data, audit_hash in audits:
+            json_hash = hashlib.sha256(json.dumps(json_data, sort_keys=True).encode()).hexdigest()
+            user = conn.execute('''
+            UPDATE users
+            SET audit_hash = ?, verified = 1
+            WHERE pid = ? AND json_hash = ?
+            RETURNING discord_user_id
+            ''', (audit_hash, pid, json_hash)).fetchone()
+            if user is None:
+                user = conn.execute('''
+                UPDATE users 
+                SET json_hash = ?, audit_hash = ?, earned_units = ?, wip_units = ?, verified = 1 
+                WHERE pid = ?
+                RETURNING discord_user_id, id
+                ''', (json_hash, audit_hash, json_data.get('earned_units'), json_data.get('wip_units'),
+                      pid)).fetchone()
+                if user is not None:
+                    _store_audit(conn, user[1], json_data)
+            stored.append((user[0], json_hash) if user else None)
+    return stored
+
+def _store_audit(conn: sqlite3.Connection, user_id: int, audit: dict) -> None:
+    conn.execute('DELETE FROM majors WHERE user_id = ?', (user_id,))
+    for slot in ('major', 'second_major'):
+        if slot not in audit:
+            continue
+        major_id = conn.execute(
+            'INSERT INTO majors (user_id, slot, title) VALUES (?, ?, ?)', (user_id, slot, audit[slot]['title'])
+        ).lastrowid
+        for category_position, category in enumerate(audit[slot]['categories']):
+            category_id = conn.execute(
+                'INSERT INTO categories (major_id, position, title) VALUES (?, ?, ?)',
+                (major_id, category_position, category['major_category'])
+            ).lastrowid
+            for subreq_position, subreq in enumerate(category['subreqs']):
+                subreq_id = conn.execute('''
+                INSERT INTO subreqs (category_id, position, title, progress_type, remaining)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (category_id, subreq_position, subreq['title'], subreq['progress']['type'],
+                      subreq['progress']['remaining'])).lastrowid
+                conn.executemany(
+                    'INSERT INTO subreq_courses (subreq_id, position, code, completed) VALUES (?, ?, ?, ?)',
+                    [(subreq_id, i, code, True) for i, code in enumerate(subreq['completed_courses'])] +
+                    [(subreq_id, i, code, False) for i, code in enumerate(subreq['needed_courses'])]
+                )
+
+def get_audit(discord_user_id):
+    '''
+    Rebuild the parsed audit of a user from the audit tables, or None if they have no audit.
+    '''
+    audit, _ = get_audit_with_version(discord_user_id)
+    return audit
+
+def get_audit_with_version(discord_user_id):
+    '''
+    The parsed audit of a user and its version (the json hash), or (None, None) if they have no
+    audit. Both are read in one transaction, so the version always matches the audit.
+    '''
+    conn = connect()
+    conn.execute('BEGIN')
+    try:
+        return _read_audit(conn, discord_user_id)
+    finally:
+        conn.commit()
+
+def _read_audit(conn: sqlite3.Connection, discord_user_id):
+    user = conn.execute('''
+    SELECT id, pid, earned_units, wip_units, json_hash FROM users
+    WHERE discord_user_id = ? AND json_hash IS NOT NULL
+    ''', (discord_user_id,)).fetchone()
+    if user is None:
+        return None, None
+    user_id, pid, earned_units, wip_units, json_hash = user
+    audit = {'pid': pid, 'earned_units': earned_units, 'wip_units': wip_units}
+
+    subreqs = {}
+    for slot, major_title, category_id, category_title, subreq_id, title, progress_type, remaining in conn.execute('''
+    SELECT m.slot, m.title, c.id, c.title, s.id, s.title, s.progress_type, s.remaining
+    FROM majors m
+    JOIN categories c ON c.major_id = m.id
+    LEFT JOIN subreqs s ON s.category_id = c.id
+    WHERE m.user_id = ?
+    ORDER BY m.id, c.position, s.position
+    ''', (user_id,)):
+        major = audit.setdefault(slot, {'title': major_title, 'categories': []})
+        if not major['categories'] or major['categories'][-1]['id'] != category_id:
+            major['categories'].append({'id': category_id, 'major_category': category_title, 'subreqs': []})
+        if subreq_id is None:
+            continue
+        subreqs[subreq_id] = {
+            'title': title,
+            'progress': {
+                'type': progress_type,
+                'remaining': int(remaining) if progress_type != 'units' else remaining
+            },
+            'completed_courses': [],
+            'needed_courses': []
+        }
+        major['categories'][-1]['subreqs'].append(subreqs[subreq_id])
+    for slot in ('major', 'second_major'):
+        for category in audit.get(slot, {}).get('categories', []):
+            del category['id']
+
+    for subreq_id, code, completed in conn.execute('''
+    SELECT sc.subreq_id, sc.code, sc.completed
+    FROM subreq_courses sc
+    JOIN subreqs s ON s.id = sc.subreq_id
+    JOIN categories c ON c.id = s.category_id
+    JOIN majors m ON m.id = c.major_id
+    WHERE m.user_id = ?
+    ORDER BY sc.subreq_id, sc.completed DESC, sc.position
+    ''', (user_id,)):
+        subreqs[subreq_id]['completed_courses' if completed else 'needed_courses'].append(code)
+    return audit, json_hash
+
+def get_users_needing(code: str) -> list:
+    '''
+    (discord_user_id, pid) of every verified user with an unfinished requirement that lists the
+    course as an option.
+    '''
+    return connect().execute('''
+    SELECT DISTINCT u.discord_user_id, u.pid
+    FROM subreq_courses sc
+    JOIN subreqs s ON s.id = sc.subreq_id
+    JOIN categories c ON c.id = s.category_id
+    JOIN majors m ON m.id = c.major_id
+    JOIN users u ON u.id = m.user_id
+    WHERE sc.code = ? AND sc.completed = 0 AND s.progress_type != 'complete' AND u.verified = 1
+    ''', (code,)).fetchall()
+
+def get_incomplete_subreqs(discord_user_id) -> list:
+    '''
+    Every unfinished subrequirement of a user as (major, category, subrequirement, progress type,
+    remaining) rows.
+    '''
+    return connect().execute('''
+    SELECT m.title, c.title, s.title, s.progress_type, s.remaining
+    FROM users u
+    JOIN majors m ON m.user_id = u.id
+    JOIN categories c ON c.major_id = m.id
+    JOIN subreqs s ON s.category_id = c.id
+    WHERE u.discord_user_id = ? AND s.progress_type != 'complete'
+    ORDER BY m.id, c.position, s.position
+    ''', (discord_user_id,)).fetchall()
+
+def get_course_progress(discord_user_ids: list | None = None) -> dict:
+    '''
+    Completed courses and the courses still listed as options for unfinished requirements of each
+    verified user, as {discord_user_id: (completed, needed)} with the needed courses in audit
+    order. All verified users are read in one pass when no ids are given.
+    '''
+    query = '''
+    SELECT u.discord_user_id, sc.code, sc.completed, s.progress_type
+    FROM users u
+    JOIN majors m ON m.user_id = u.id
+    JOIN categories c ON c.major_id = m.id
+    JOIN subreqs s ON s.category_id = c.id
+    JOIN subreq_courses sc ON sc.subreq_id = s.id
+    WHERE u.verified = 1 {}
+    ORDER BY u.id, m.id, c.position, s.position, sc.completed DESC, sc.position
+    '''
+    conn = connect()
+    if discord_user_ids is None:
+        rows = conn.execute(query.format(''))
     else:
-        return None
\ No newline at end of file
+        discord_user_ids = [str(discord_user_id) for discord_user_id in discord_user_ids]
+        rows = []
+        for i in range(0, len(discord_user_ids), 500):
+            chunk = discord_user_ids[i:i + 500]
+            rows.extend(conn.execute(
+                query.format(f"AND u.discord_user_id IN ({', '.join('?' * len(chunk))})"), chunk
+            ))
+    progress = {}
+    for discord_user_id, code, completed, progress_type in rows:
+        completed_codes, needed = progress.setdefault(discord_user_id, (set(), {}))
+        if completed:
+            completed_codes.add(code)
+        elif progress_type != 'complete':
+            needed[code] = None
+    return {discord_user_id: (completed, list(needed)) for discord_user_id, (completed, needed) in progress.items()}
@@ -1,56 +1,257 @@
+import asyncio
+import heapq
+import os
 import sqlite3
 from datetime import datetime, timedelta, timezone
+from time import perf_counter
 import discord
-from discord.ext import tasks
 
-from ..const import BOT
-from ..utils import write_json
-from ..db import get_json_data, check_user_verified, delete_user, check_user_exists
-from ..functions.search import search
+from ..const import BOT, ENROLLMENT_TZ, METRICS_DUMP_INTERVAL
+from ..metrics import METRICS, PROFILER
+from ..utils import LRUCache, write_json
+from ..db import (get_audit_with_version, get_audit_versions, get_verified_users, delete_user,
+                  check_user_exists, link_or_update_pid, set_reminder_pass, get_reminder_recipients, run)
+from ..functions.service import SEARCH_SERVICE
+from ..functions.eligibility import next_courses
+from ..functions.enrollment import SCHEDULE, PASS_NAMES, now as enrollment_now
 
 from .paginator import MultiPage
 
 # ----------------------------------------- begin setup ------------------------------------------ #
 
-verification_timers = {}
+class VerificationWatcher:
+    '''
+    Tracks users waiting for their PID to be verified by an audit upload. The audit server wakes
+    the watcher through the notification socket, and all pending users are then checked with one
+    query; a slow fallback check covers lost notifications, and also drops cached /me pages whose
+    audit version is no longer the stored one. Deadlines are kept in a heap so only expired links
+    are looked at. The loop runs while there are users waiting or pages cached.
+    '''
+    FALLBACK_INTERVAL = 60
 
-def start_verification_timer(discord_user_id, ctx):
-    deadline = datetime.now(timezone.utc) + timedelta(minutes=30)
-    verification_timers[discord_user_id] = {'deadline': deadline, 'ctx': ctx}
-    if len(verification_timers) == 1:
-        print("[Routine] Starting verification loop")
-        check_verification_status.start()
+    def __init__(self):
+        self.pending = {}
+        self.deadlines = []
+        self.wake = asyncio.Event()
+        self.task = None
 
-@tasks.loop(seconds=15)
-async def check_verification_status():
-    if not verification_timers:
-        print(f"[Routine] Stopping routine: no more verifications active.")
-        check_verification_status.cancel()
-        return
-    verify_list = [(k, v) for k, v in verification_timers.items()]
-    for discord_user_id, user_data in verify_list:
-        print(f"[Routine] Checking verification of user id {discord_user_id}")
-
-        ctx: discord.ApplicationContext = user_data['ctx']
-        deadline = user_data['deadline']
-        if check_user_verified(discord_user_id):
-            await ctx.send_followup(embed=discord.Embed(
+    def start(self, discord_user_id, ctx):
+        deadline = datetime.now(timezone.utc) + timedelta(minutes=30)
+        self.pending[discord_user_id] = {'deadline': deadline, 'ctx': ctx}
+        heapq.heappush(self.deadlines, (deadline, discord_user_id))
+        self.watch()
+
+    def watch(self):
+        if self.task is None or self.task.done():
+            print("[Routine] Starting verification loop")
+            self.task = asyncio.create_task(self.run())
+
+    def notify(self, discord_user_id):
+        if discord_user_id in self.pending:
+            self.wake.set()
+
+    async def run(self):
+        while self.pending or len(ME_PAGES):
+            timeout = self.FALLBACK_INTERVAL
+            if self.deadlines:
+                until_deadline = (self.deadlines[0][0] - datetime.now(timezone.utc)).total_seconds()
+                timeout = max(0, min(timeout, until_deadline))
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"[Routine] Error while checking verifications: {e}")
+        print(f"[Routine] Stopping routine: no more verifications active or pages cached.")
+
+    async def check(self):
+        await self.check_pages()
+        for discord_user_id in await run(get_verified_users, list(self.pending)):
+            user_data = self.pending.pop(discord_user_id)
+            await user_data['ctx'].send_followup(embed=discord.Embed(
                 title = "Success!",
                 description = "Your PID has been verified successfully!",
                 color = discord.Color.green()
             ))
             print(f"[Routine] Verified user id {discord_user_id}")
-            verification_timers.pop(discord_user_id, None)
-            continue
-        if datetime.now(timezone.utc) > deadline:
-            await ctx.send_followup(embed=discord.Embed(
+
+        now = datetime.now(timezone.utc)
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, discord_user_id = heapq.heappop(self.deadlines)
+            user_data = self.pending.get(discord_user_id)
+            # skip users who were verified or linked again since this deadline was set
+            if user_data is None or user_data['deadline'] != deadline:
+                continue
+            self.pending.pop(discord_user_id)
+            await user_data['ctx'].send_followup(embed=discord.Embed(
                 title = "Timeout",
                 description = "No audit has been uploaded. Canceling link...",
                 color = discord.Color.yellow()
             ))
             print(f"[Routine] Timeout verification user id {discord_user_id}")
-            delete_user(discord_user_id)
-            verification_timers.pop(discord_user_id, None)
+            await run(delete_user, discord_user_id)
+            ME_PAGES.pop(discord_user_id)
+
+    async def check_pages(self):
+        cached = ME_PAGES.items()
+        if not cached:
+            return
+        versions = await run(get_audit_versions, [discord_user_id for discord_user_id, _ in cached])
+        for discord_user_id, (version, _) in cached:
+            if versions.get(discord_user_id) != version:
+                ME_PAGES.pop(discord_user_id)
+
+VERIFICATION = VerificationWatcher()
+
+class EnrollmentReminders:
+    '''
+    Sends enrollment reminders from one timer heap with an entry per window opening, not per user.
+    Entries that come due together are handled as one batch: the recipients of every due pass are
+    read with one query, each user gets a single message, and messages go out in rate limited
+    batches so that a popular opening does not flood the event loop or Discord's rate limits.
+    '''
+    LEAD = timedelta(minutes=15)
+    BATCH_SIZE = 25
+    BATCH_INTERVAL = 1.0
+    MAX_SLEEP = 60 * 60
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.heap = []
+        self.task = None
+
+    def start(self):
+        if self.task is not None and not self.task.done():
+            return
+        # only windows whose reminder is still ahead: the others were sent before a restart
+        upcoming = self.schedule.next_after(enrollment_now() + self.LEAD, count=len(self.schedule))
+        self.heap = [(window['start'] - self.LEAD, i, window) for i, window in enumerate(upcoming)]
+        heapq.heapify(self.heap)
+        if self.heap:
+            print(f"[Routine] Scheduled {len(self.heap)} enrollment reminders")
+            self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while self.heap:
+            # sleep in bounded steps so that clock changes are noticed
+            delay = (self.heap[0][0] - enrollment_now()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(min(delay, self.MAX_SLEEP))
+                continue
+            due = []
+            while self.heap and self.heap[0][0] <= enrollment_now():
+                due.append(heapq.heappop(self.heap)[2])
+            try:
+                await self.send(due)
+            except Exception as e:
+                print(f"[Routine] Error while sending enrollment reminders: {e}")
+
+    async def send(self, windows: list):
+        recipients = await run(get_reminder_recipients, [window['pass'] for window in windows])
+        messages = {}
+        for window in windows:
+            for discord_user_id in recipients.get(window['pass'], []) + recipients.get('all', []):
+                messages.setdefault(discord_user_id, []).append(window)
+        messages = list(messages.items())
+        sent = 0
+        for i in range(0, len(messages), self.BATCH_SIZE):
+            if i:
+                await asyncio.sleep(self.BATCH_INTERVAL)
+            results = await asyncio.gather(
+                *(self.remind(discord_user_id, user_windows)
+                  for discord_user_id, user_windows in messages[i:i + self.BATCH_SIZE]),
+                return_exceptions=True
+            )
+            sent += sum(result is None for result in results)
+        print(f"[Routine] Sent {sent} of {len(messages)} enrollment reminders")
+
+    async def remind(self, discord_user_id: str, windows: list):
+        user = BOT.get_user(int(discord_user_id)) or await BOT.fetch_user(int(discord_user_id))
+        await user.send(embed=discord.Embed(
+            title = "Enrollment reminder",
+            description = '\n'.join(
+                f"**{window['quarter']} {window['name']}** opens "
+                f"{discord.utils.format_dt(window['start'].replace(tzinfo=ENROLLMENT_TZ), 'R')}."
+                for window in windows
+            ),
+            color = discord.Color.green()
+        ))
+
+REMINDERS = EnrollmentReminders(SCHEDULE)
+
+# rendered /me pages per discord user id, as (audit version, [embed payloads])
+ME_PAGES = LRUCache(maxsize=2048, ttl=6 * 60 * 60)
+# the last audit version the audit server announced per discord user id, which cached pages must
+# match; a /me that read the audit just before an announcement would otherwise cache the old one
+AUDIT_VERSIONS = LRUCache(maxsize=4096, ttl=6 * 60 * 60)
+
+class MetricsReporter:
+    '''
+    Times every slash command from the interaction to its completion or error, and periodically
+    writes a snapshot of the bot's metrics to PATH with a one line summary in the log.
+    '''
+    PATH = 'data/metrics/bot.json'
+
+    def __init__(self, interval: float = METRICS_DUMP_INTERVAL):
+        self.interval = interval
+        self.started = {}
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def command_started(self, ctx: discord.ApplicationContext):
+        self.started[ctx.interaction.id] = perf_counter()
+
+    def command_finished(self, ctx: discord.ApplicationContext, error: bool = False):
+        start = self.started.pop(ctx.interaction.id, None)
+        if start is None:
+            return
+        name = f'command.{ctx.command.qualified_name if ctx.command else "unknown"}'
+        METRICS.observe(name, perf_counter() - start)
+        if error:
+            METRICS.inc(f'{name}.errors')
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"[Metrics] Error while writing metrics: {e}")
+
+    def dump(self):
+        snapshot = METRICS.snapshot()
+        os.makedirs(os.path.dirname(self.PATH), exist_ok=True)
+        write_json(self.PATH, snapshot)
+        commands = {
+            name: h for name, h in snapshot['histograms'].items()
+            if name.startswith('command.') and h['count']
+        }
+        print("[Metrics] " + (', '.join(
+            f"{name[8:]} {h['count']}x p95={h['p95_ms']:.0f}ms" for name, h in commands.items()
+        ) or "No commands yet"))
+
+METRICS_REPORTER = MetricsReporter()
+METRICS.gauge('bot.me_pages', ME_PAGES.stats)
+METRICS.gauge('bot.verification_pending', lambda: len(VERIFICATION.pending))
+METRICS.gauge('bot.reminders_scheduled', lambda: len(REMINDERS.heap))
+
+@BOT.listen('on_application_command')
+async def on_application_command(ctx: discord.ApplicationContext):
+    METRICS_REPORTER.command_started(ctx)
+
+@BOT.listen('on_application_command_completion')
+async def on_application_command_completion(ctx: discord.ApplicationContext):
+    METRICS_REPORTER.command_finished(ctx)
+
+@BOT.listen('on_application_command_error')
+async def on_application_command_error(ctx: discord.ApplicationContext, error: Exception):
+    METRICS_REPORTER.command_finished(ctx, error=True)
 
 # ------------------------------------------ end setup ------------------------------------------- #
 
@@ -71,17 +272,20 @@ async def search(
         choices=['All Courses', 'Undergraduate', 'Graduate', 'Upper Division', 'Lower Division']
     ) = 'All Courses' # type: ignore
 ) -> None:
-    courses = search(numbers, keywords, dept, division)
+    courses = await SEARCH_SERVICE.search(numbers, keywords, dept, division)
     
     if courses:
         total = len(courses)
-        courses = [courses[i:min(i+3, len(courses))] for i in range(0, len(courses), 3)]
-        embed_pages = [
-            discord.Embed(
+        description = (
+            f"Filters: {'\nCourse Codes: ' + numbers if numbers else ''}\n"
+            f"Division: {division}{'\nKeywords: ' + keywords if keywords else ''}"
+            f"{'\nDepartment: '+dept.strip().upper() if dept else ''}"
+        )
+
+        def render(page):
+            return discord.Embed(
                 title=f"Search results ({total} total)",
-                description=f"Filters: {'\nCourse Codes: ' + numbers if numbers else ''}\n"
-                f"Division: {division}{'\nKeywords: ' + keywords if keywords else ''}"
-                f"{'\nDepartment: '+dept.strip().upper() if dept else ''}",
+                description=description,
                 fields=[
                     discord.EmbedField(
                         name = f"{course['code']} | {course['title']}",
@@ -91,14 +295,12 @@ async def search(
                             else course['desc'][:1021] + '...'
                         )
                     )
-                    for course in course_section
+                    for course in courses[page * 3:page * 3 + 3]
                 ],
                 color=discord.Color.blue()
-            ) for course_section in courses
-        ]
+            )
         paginator_cog: MultiPage = BOT.get_cog('MultiPage')
-        paginator_cog.set_pages(embed_pages)
-        await paginator_cog.paginate(ctx)
+        await paginator_cog.paginate(ctx, render, (total + 2) // 3)
     else:
         await ctx.send_response(embed=discord.Embed(
             title = f"Search results (0 total)",
@@ -108,50 +310,12 @@ async def search(
             color = discord.Color.red()
         ))
 
-@BOT.command(
-    name = 'me',
-    description = 'Get your information.'
-)
-async def me(ctx: discord.ApplicationContext):
-    data = get_json_data(ctx.author.id)
-    if not data:
-        await ctx.send_response(embed=discord.Embed(
-            title='Error',
-            description='You are not registered with TritonThink. Use /link to link your UCSD PID!',
-            color=discord.Color.red()
-        ))
-        return
-    write_json(f'data/{ctx.author.id}.json', data)
-    
-    def major_overview(major_data):
-        fields = []
-        for category in major_data["categories"]:
-            value = ''
-            for subreq in category['subreqs']:
-                value += f'**{subreq['title']}**: '
-                match subreq['progress']['type']:
-                    case 'complete':
-                        value += 'Requirements Complete. ✅\n'
-                    case 'units':
-                        value += f'{subreq["progress"]["remaining"]} units remaining. 🟥\n'
-                    case 'courses':
-                        value += f'{subreq["progress"]["remaining"]} courses remaining. 🟥\n'
-            
-            fields.append(discord.EmbedField(
-                name=category['major_category'],
-                value=value.rstrip('\n')
-            ))
-        page = discord.Embed(
-            title=major_data['title'],
-            fields=fields,
-            color=discord.Color.blue()
-        )
-        return page
-    
-    def category_overview(category_data):
-        fields = []
-        for subreq in category_data['subreqs']:
-            value = ''
+def major_overview(major_data):
+    fields = []
+    for category in major_data["categories"]:
+        value = ''
+        for subreq in category['subreqs']:
+            value += f'**{subreq['title']}**: '
             match subreq['progress']['type']:
                 case 'complete':
                     value += 'Requirements Complete. ✅\n'
@@ -159,22 +323,50 @@ async def me(ctx: discord.ApplicationContext):
                     value += f'{subreq["progress"]["remaining"]} units remaining. 🟥\n'
                 case 'courses':
                     value += f'{subreq["progress"]["remaining"]} courses remaining. 🟥\n'
-            if subreq['progress']['type'] != 'complete':
-                value += f"Choose from: "
-                if len(subreq['needed_courses']) > 20:
-                    value += ', '.join(subreq['needed_courses'][:20]) + ' or more...'
-                else:
-                    value += ', '.join(subreq['needed_courses'])
-            fields.append(discord.EmbedField(
-                name=subreq['title'],
-                value=value
-            ))
-        page = discord.Embed(
-            title=category_data['major_category'],
-            fields=fields,
-            color=discord.Color.blue()
-        )
-        return page
+        
+        fields.append(discord.EmbedField(
+            name=category['major_category'],
+            value=value.rstrip('\n')
+        ))
+    page = discord.Embed(
+        title=major_data['title'],
+        fields=fields,
+        color=discord.Color.blue()
+    )
+    return page
+
+def category_overview(category_data):
+    fields = []
+    for subreq in category_data['subreqs']:
+        value = ''
+        match subreq['progress']['type']:
+            case 'complete':
+                value += 'Requirements Complete. ✅\n'
+            case 'units':
+                value += f'{subreq["progress"]["remaining"]} units remaining. 🟥\n'
+            case 'courses':
+                value += f'{subreq["progress"]["remaining"]} courses remaining. 🟥\n'
+        if subreq['progress']['type'] != 'complete':
+            value += f"Choose from: "
+            if len(subreq['needed_courses']) > 20:
+                value += ', '.join(subreq['needed_courses'][:20]) + ' or more...'
+            else:
+                value += ', '.join(subreq['needed_courses'])
+        fields.append(discord.EmbedField(
+            name=subreq['title'],
+            value=value
+        ))
+    page = discord.Embed(
+        title=category_data['major_category'],
+        fields=fields,
+        color=discord.Color.blue()
+    )
+    return page
+
+def render_audit(data) -> list:
+    '''
+    The /me pages for a parsed audit, as embed payloads so they can be cached and rebuilt cheaply.
+    '''
     embed_pages = []
     if "major" in data:
         embed_pages.append(major_overview(data["major"]))
@@ -184,9 +376,143 @@ async def me(ctx: discord.ApplicationContext):
         embed_pages.extend(category_overview(category) for category in data["major"]["categories"])
     if "second_major" in data:
         embed_pages.extend(category_overview(category) for category in data["second_major"]["categories"])
+    return [page.to_dict() for page in embed_pages]
+
+def on_audit_stored(discord_user_id, version=None):
+    '''
+    Called when the audit server stores an audit. Records the announced version, drops the user's
+    cached /me pages unless they were rendered from it, and wakes the verification watcher.
+    '''
+    if version is None:
+        AUDIT_VERSIONS.pop(discord_user_id)
+    else:
+        AUDIT_VERSIONS.put(discord_user_id, version)
+    cached = ME_PAGES.get(discord_user_id)
+    if cached is not None and (version is None or cached[0] != version):
+        ME_PAGES.pop(discord_user_id)
+    VERIFICATION.notify(discord_user_id)
+
+@BOT.command(
+    name = 'me',
+    description = 'Get your information.'
+)
+async def me(ctx: discord.ApplicationContext):
+    discord_user_id = str(ctx.author.id)
+    cached = ME_PAGES.get(discord_user_id)
+    if cached is not None and cached[0] != AUDIT_VERSIONS.get(discord_user_id, cached[0]):
+        ME_PAGES.pop(discord_user_id)
+        cached = None
+    if cached is None:
+        data, version = await run(get_audit_with_version, discord_user_id)
+        if not data:
+            await ctx.send_response(embed=discord.Embed(
+                title='Error',
+                description='You are not registered with TritonThink. Use /link to link your UCSD PID!',
+                color=discord.Color.red()
+            ))
+            return
+        cached = (version, render_audit(data))
+        # an audit announced while this one was read replaces it, so it is not worth caching
+        if AUDIT_VERSIONS.get(discord_user_id, version) == version:
+            ME_PAGES.put(discord_user_id, cached)
+            VERIFICATION.watch()
+
+    payloads = cached[1]
     paginator_cog: MultiPage = BOT.get_cog('MultiPage')
-    paginator_cog.set_pages(embed_pages)
-    await paginator_cog.paginate(ctx)
+    await paginator_cog.paginate(
+        ctx, lambda page: discord.Embed.from_dict(payloads[page]), len(payloads),
+        empty='Your degree audit has no majors to show yet.'
+    )
+
+@BOT.command(
+    name = 'next',
+    description = 'List the courses you still need that you can take next.'
+)
+async def next_command(ctx: discord.ApplicationContext):
+    courses = await run(next_courses, str(ctx.author.id))
+    if courses is None:
+        await ctx.send_response(embed=discord.Embed(
+            title='Error',
+            description='You are not registered with TritonThink. Use /link to link your UCSD PID!',
+            color=discord.Color.red()
+        ))
+        return
+    if not courses:
+        await ctx.send_response(embed=discord.Embed(
+            title='Next courses (0 total)',
+            description='There are no courses left in your degree audit whose prerequisites you meet yet.',
+            color=discord.Color.red()
+        ))
+        return
+
+    def render(page):
+        return discord.Embed(
+            title=f"Next courses ({len(courses)} total)",
+            description='\n'.join(
+                f"**{course['code']}** {course['title']}".rstrip()
+                for course in courses[page * 15:page * 15 + 15]
+            ),
+            color=discord.Color.blue()
+        )
+    paginator_cog: MultiPage = BOT.get_cog('MultiPage')
+    await paginator_cog.paginate(ctx, render, (len(courses) + 14) // 15)
+
+def describe_window(window: dict) -> str:
+    start = discord.utils.format_dt(window['start'].replace(tzinfo=ENROLLMENT_TZ), 'f')
+    end = discord.utils.format_dt(window['end'].replace(tzinfo=ENROLLMENT_TZ), 'f')
+    return f"**{window['quarter']} {window['name']}**: {start} to {end}"
+
+@BOT.command(
+    name = 'enrollment',
+    description = 'Show the enrollment passes open now and the next ones to open.'
+)
+async def enrollment(ctx: discord.ApplicationContext):
+    current = enrollment_now()
+    open_windows = SCHEDULE.open_at(current)
+    upcoming = SCHEDULE.next_after(current, count=3)
+    await ctx.send_response(embed=discord.Embed(
+        title = "Enrollment",
+        fields = [
+            discord.EmbedField(
+                name = "Open now",
+                value = '\n'.join(map(describe_window, open_windows)) or 'No pass is open.'
+            ),
+            discord.EmbedField(
+                name = "Next",
+                value = '\n'.join(map(describe_window, upcoming)) or 'No upcoming passes.'
+            )
+        ],
+        color = discord.Color.blue()
+    ))
+
+@BOT.command(
+    name = 'remind',
+    description = 'Get a direct message before your enrollment pass opens.'
+)
+async def remind(
+    ctx: discord.ApplicationContext,
+    enrollment_pass: discord.Option(
+        str,
+        'Your enrollment pass',
+        choices=[discord.OptionChoice(name, value) for value, name in PASS_NAMES.items()]
+        + [discord.OptionChoice('Every pass', 'all'), discord.OptionChoice('Stop reminders', 'off')]
+    ) # type: ignore
+):
+    reminder_pass = None if enrollment_pass == 'off' else enrollment_pass
+    if not await run(set_reminder_pass, str(ctx.author.id), reminder_pass):
+        await ctx.send_response(embed=discord.Embed(
+            title='Error',
+            description='You are not registered with TritonThink. Use /link to link your UCSD PID!',
+            color=discord.Color.red()
+        ))
+        return
+    await ctx.send_response(embed=discord.Embed(
+        title="Success!",
+        description="Enrollment reminders are off." if reminder_pass is None else
+        f"You will be reminded {REMINDERS.LEAD.seconds // 60} minutes before "
+        f"{'every pass' if reminder_pass == 'all' else PASS_NAMES[reminder_pass]} opens.",
+        color=discord.Color.green()
+    ))
 
 @BOT.command(
     name = 'link',
@@ -204,22 +530,15 @@ async def link(ctx: discord.ApplicationContext, pid: str):
     discord_user_id = str(ctx.author.id)
 
     try:
-        conn = sqlite3.connect('data/users.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO users (discord_user_id, pid)
-        VALUES (?, ?)
-        ON CONFLICT(discord_user_id) DO UPDATE SET pid=excluded.pid
-        ''', (discord_user_id, pid))
-        
-        conn.commit()
+        await run(link_or_update_pid, discord_user_id, pid)
+        ME_PAGES.pop(discord_user_id)
         await ctx.send_response(embed=discord.Embed(
             title="Success!",
             description=f"Your PID has been updated to {pid}. Please upload a degree audit within "
             "the next 30 minutes to confirm your PID.",
             color=discord.Color.green()
         ))
-        start_verification_timer(discord_user_id, ctx)
+        VERIFICATION.start(discord_user_id, ctx)
     except sqlite3.IntegrityError:
         await ctx.send_response(embed=discord.Embed(
             title="Error",
@@ -233,8 +552,6 @@ async def link(ctx: discord.ApplicationContext, pid: str):
             color=discord.Color.red()
         ))
         print(f"Error while linking: {e}")
-    finally:
-        conn.close()
 
 @BOT.command(
     name = 'unlink',
@@ -244,10 +561,11 @@ async def unlink(ctx: discord.ApplicationContext):
     discord_user_id = str(ctx.author.id)
 
     try:
-        existing = check_user_exists(discord_user_id)
+        existing = await run(check_user_exists, discord_user_id)
 
         if existing:
-            delete_user(discord_user_id)
+            await run(delete_user, discord_user_id)
+            ME_PAGES.pop(discord_user_id)
             await ctx.send_response(embed=discord.Embed(
                 title = "Success!",
                 description="Your PID has been unlinked successfully.",
@@ -267,3 +585,28 @@ async def unlink(ctx: discord.ApplicationContext):
         ))
         print(f"Error while unlinking: {e}")
 
+@BOT.command(
+    name = 'profile',
+    description = 'Turn the sampling profiler on or off (bot owner only).'
+)
+async def profile(ctx: discord.ApplicationContext, enabled: bool, threshold_ms: int = 500):
+    if not await BOT.is_owner(ctx.author):
+        await ctx.send_response(embed=discord.Embed(
+            title="Error",
+            description="Only the bot owner can use this command.",
+            color=discord.Color.red()
+        ), ephemeral=True)
+        return
+    if enabled:
+        PROFILER.start(threshold_ms / 1000)
+    else:
+        PROFILER.stop()
+    status = PROFILER.status()
+    await ctx.send_response(embed=discord.Embed(
+        title="Profiler",
+        description=(
+            f"Capturing searches slower than {status['threshold_ms']:.0f}ms."
+            if status['enabled'] else "Profiler is off."
+        ) + f"\n{status['captured']} profiles captured so far.",
+        color=discord.Color.green()
+    ), ephemeral=True)
@@ -1,39 +1,108 @@
+from collections import OrderedDict
+from typing import Callable
+
 import discord
-from discord.ext import commands, pages
+from discord.ext import commands
+
+
+class PageSession(discord.ui.View):
+    '''
+    Paginator state for one interaction. Pages are rendered by render(index) only when a user
+    navigates to them, so a session holds the result cursor instead of a list of embeds. Only the
+    author of the command can turn the pages. The idle timeout restarts on every button press.
+    '''
+    def __init__(self, render: Callable[[int], discord.Embed], count: int, author: discord.abc.User,
+                 timeout: float, on_close):
+        super().__init__(timeout=timeout, disable_on_timeout=True)
+        self.render = render
+        self.author = author
+        self.count = count
+        self.index = 0
+        self.on_close = on_close
+        self.update_indicator()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user is not None and interaction.user.id == self.author.id:
+            return True
+        await interaction.response.send_message(
+            "Only the person who used this command can turn its pages.", ephemeral=True
+        )
+        return False
+
+    def update_indicator(self):
+        self.page_indicator.label = f'{self.index + 1}/{self.count}'
+
+    async def show(self, interaction: discord.Interaction, index: int):
+        # pages loop around at either end
+        self.index = index % self.count
+        self.update_indicator()
+        await interaction.response.edit_message(embed=self.render(self.index), view=self)
+
+    @discord.ui.button(emoji="⏪", style=discord.ButtonStyle.green)
+    async def first(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(emoji="⬅", style=discord.ButtonStyle.green)
+    async def prev(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.show(interaction, self.index - 1)
+
+    @discord.ui.button(style=discord.ButtonStyle.gray, disabled=True)
+    async def page_indicator(self, button: discord.ui.Button, interaction: discord.Interaction):
+        pass
+
+    @discord.ui.button(emoji="➡", style=discord.ButtonStyle.green)
+    async def next(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.show(interaction, self.index + 1)
+
+    @discord.ui.button(emoji="⏩", style=discord.ButtonStyle.green)
+    async def last(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.show(interaction, self.count - 1)
+
+    async def on_timeout(self):
+        self.on_close(self)
+        await super().on_timeout()
+
+    async def close(self):
+        '''
+        End the session early, leaving the message on its current page with the buttons disabled.
+        '''
+        self.stop()
+        await super().on_timeout()
 
 
 class MultiPage(commands.Cog):
+    '''
+    Keeps one PageSession per interaction. At most MAX_SESSIONS are live; starting another closes
+    the least recently started one, and sessions idle for IDLE_TIMEOUT seconds close themselves.
+    '''
+    MAX_SESSIONS = 256
+    IDLE_TIMEOUT = 600
+
     def __init__(self, bot):
         self.bot = bot
-        self.pages = []
-
-    def get_pages(self):
-        return self.pages
-    
-    def set_pages(self, pages):
-        self.pages = pages
-
-    async def paginate(self, ctx: discord.ApplicationContext):
-        """Demonstrates using emojis for the paginator buttons instead of labels."""
-        page_buttons = [
-            pages.PaginatorButton(
-                "first", emoji="⏪", style=discord.ButtonStyle.green
-            ),
-            pages.PaginatorButton("prev", emoji="⬅", style=discord.ButtonStyle.green),
-            pages.PaginatorButton(
-                "page_indicator", style=discord.ButtonStyle.gray, disabled=True
-            ),
-            pages.PaginatorButton("next", emoji="➡", style=discord.ButtonStyle.green),
-            pages.PaginatorButton("last", emoji="⏩", style=discord.ButtonStyle.green),
-        ]
-        paginator = pages.Paginator(
-            pages=self.get_pages(),
-            show_disabled=True,
-            show_indicator=True,
-            use_default_buttons=False,
-            custom_buttons=page_buttons,
-            loop_pages=True,
-            disable_on_timeout=True, 
-            timeout=3600
-        )
-        await paginator.respond(ctx.interaction, ephemeral=False)
\ No newline at end of file
+        self.sessions = OrderedDict()
+
+    def close_session(self, session: PageSession):
+        for key, live in self.sessions.items():
+            if live is session:
+                del self.sessions[key]
+                break
+
+    async def paginate(self, ctx: discord.ApplicationContext, render: Callable[[int], discord.Embed],
+                       count: int, empty: str = 'There is nothing to show.'):
+        '''
+        Respond with page 0 of count pages, rendering each page with render(index) on demand, or
+        with the empty message if there are no pages.
+        '''
+        if count == 0:
+            await ctx.respond(embed=discord.Embed(description=empty, color=discord.Color.red()))
+            return
+        if count == 1:
+            await ctx.respond(embed=render(0))
+            return
+        session = PageSession(render, count, ctx.author, self.IDLE_TIMEOUT, self.close_session)
+        self.sessions[ctx.interaction.id] = session
+        while len(self.sessions) > self.MAX_SESSIONS:
+            _, oldest = self.sessions.popitem(last=False)
+            await oldest.close()
+        await ctx.respond(embed=render(0), view=session)
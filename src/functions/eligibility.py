@@ -0,0 +1,34 @@
+from ..courses.catalog import normalize_code
+from ..db import check_user_has_audit, get_course_progress
+from ..resources import RESOURCES
+
+def course_titles(codes: list) -> list:
+    '''
+    {'code', 'title'} entries for course codes, with an empty title for courses not in the catalog.
+    '''
+    catalog = RESOURCES.catalog
+    entries = []
+    for code in codes:
+        rows = catalog.code_rows([normalize_code(code)])
+        entries.append({'code': code, 'title': catalog.courses[rows[0]]['title'] if len(rows) else ''})
+    return entries
+
+def next_courses(discord_user_id) -> list | None:
+    '''
+    The courses a user still needs whose prerequisites their completed courses meet, or None if
+    the user has no verified audit.
+    '''
+    progress = get_course_progress([discord_user_id]).get(str(discord_user_id))
+    if progress is None:
+        # an audit that lists no courses has nothing left to take
+        return [] if check_user_has_audit(discord_user_id) else None
+    return course_titles(RESOURCES.prereqs.eligible([progress])[0])
+
+def next_courses_all(discord_user_ids: list | None = None) -> dict:
+    '''
+    next_courses for many users at once, by default every verified user: their progress is read in
+    one query and evaluated against the prerequisite graph in bulk. Returns course codes keyed by
+    Discord user id.
+    '''
+    progress = get_course_progress(discord_user_ids)
+    return dict(zip(progress, RESOURCES.prereqs.eligible(list(progress.values()))))
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import numpy as np
+
+from ..const import ENROLLMENT_TIMES, ENROLLMENT_TZ
+
+PASS_NAMES = {
+    'fp4': 'First Pass (seniors)',
+    'fp3': 'First Pass (juniors)',
+    'fp2': 'First Pass (sophomores)',
+    'fp1': 'First Pass (freshmen)',
+    'fpt': 'First Pass (new transfers)',
+    'fpf': 'First Pass (new freshmen)',
+    'sp4': 'Second Pass (seniors)',
+    'sp3': 'Second Pass (juniors)',
+    'sp2': 'Second Pass (sophomores)',
+    'sp1': 'Second Pass (freshmen)',
+    'spt': 'Second Pass (new transfers)',
+    'spf': 'Second Pass (new freshmen)'
+}
+
+def now() -> datetime:
+    '''
+    Current time in the calendar's time zone, naive like the scraped windows.
+    '''
+    return datetime.now(ENROLLMENT_TZ).replace(tzinfo=None)
+
+class EnrollmentSchedule:
+    '''
+    Enrollment windows of every quarter sorted by start time in NumPy arrays. Windows can overlap,
+    but none is longer than the longest window, so the windows open at a time are among those that
+    started at most that long before it: two binary searches find them.
+    '''
+    def __init__(self, times: dict):
+        windows = sorted(
+            (start, end, qtr, pass_) for qtr, passes in times.items() for pass_, (start, end) in passes.items()
+        )
+        self.starts = np.array([w[0] for w in windows], dtype='datetime64[s]')
+        self.ends = np.array([w[1] for w in windows], dtype='datetime64[s]')
+        self.quarters = [w[2] for w in windows]
+        self.passes = [w[3] for w in windows]
+        self.longest = (self.ends - self.starts).max() if windows else np.timedelta64(0, 's')
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def window(self, i: int) -> dict:
+        return {
+            'quarter': self.quarters[i],
+            'pass': self.passes[i],
+            'name': PASS_NAMES.get(self.passes[i], self.passes[i]),
+            'start': self.starts[i].astype(datetime),
+            'end': self.ends[i].astype(datetime)
+        }
+
+    def open_at(self, when: datetime | None = None) -> list:
+        '''
+        Windows open at a time (now by default), in start order.
+        '''
+        when = np.datetime64(when or now(), 's')
+        first = np.searchsorted(self.starts, when - self.longest, side='left')
+        last = np.searchsorted(self.starts, when, side='right')
+        return [self.window(i) for i in range(first, last) if self.ends[i] > when]
+
+    def next_after(self, when: datetime | None = None, count: int = 1) -> list:
+        '''
+        The next count windows to open after a time (now by default).
+        '''
+        first = np.searchsorted(self.starts, np.datetime64(when or now(), 's'), side='right')
+        return [self.window(i) for i in range(first, min(first + count, len(self.starts)))]
+
+SCHEDULE = EnrollmentSchedule(ENROLLMENT_TIMES)
@@ -1,16 +1,111 @@
-from ..courses.embed import query
-from ..const import SEARCH_FILTERS, COURSES
+import re
+
+from ..courses.catalog import normalize_code
+from ..courses.embed import encode_queries, search_rows, normalize_query, RESULT_CACHE
+from ..const import SEARCH_TOP_K, SEARCH_MODE, RRF_K
+from ..metrics import METRICS, PROFILER
+from ..resources import RESOURCES
+
+_CODES_ONLY = re.compile(r'[a-z]{2,5} ?[0-9]+[a-z]*(?:[ ,]+[a-z]{2,5} ?[0-9]+[a-z]*)*')
+
+def parse_codes(numbers: str) -> tuple:
+    '''
+    Normalised, deduplicated course codes from a comma separated list.
+    '''
+    return tuple(sorted({normalize_code(code) for code in numbers.split(',')} - {''}))
+
+def candidate_rows(codes: tuple, dept: str, division: str):
+    '''
+    Catalog rows passing the code, department and division filters, or None if nothing is filtered.
+    '''
+    if not codes and not dept and division == 'All Courses':
+        return None
+    with METRICS.timer('search.filter'):
+        return RESOURCES.catalog.filter_rows(division, dept, codes)
+
+def is_lexical(query: str) -> bool:
+    '''
+    Whether a normalised query is answered from the BM25 index alone: always in lexical mode, and
+    otherwise for quoted queries and queries made only of course codes, where only exact terms
+    matter.
+    '''
+    if SEARCH_MODE == 'lexical':
+        return True
+    return (len(query) > 1 and query[0] == query[-1] == '"') or bool(_CODES_ONLY.fullmatch(query))
+
+def fuse(rankings: list, k: int) -> list:
+    '''
+    Reciprocal rank fusion of best-first lists of catalog rows. Rank fusion needs no calibration
+    between BM25 scores and vector distances.
+    '''
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
 
 def search(
     numbers: str = '',
     keywords: str = '',
     dept: str = '',
-    division: str = ''
+    division: str = 'All Courses',
+    k: int = SEARCH_TOP_K
 ) -> list:
-    courses = query(keywords) if keywords else COURSES
-    if numbers:
-        code_cleaned = [code.strip().upper() for code in numbers.split(',')]
-        courses = [course for course in courses if course['code'] in code_cleaned]
-    courses = [course for course in courses if SEARCH_FILTERS[division].match(course['code'])]
-    if dept:
-        courses = [course for course in courses if course['code'].startswith(dept.strip().upper())]
\ No newline at end of file
+    '''
+    Search the catalog. Course code, division and department filters are applied first, so a
+    keyword search only ranks the courses that can actually be returned. Without keywords, courses
+    are looked up through the catalog indexes and the embedding model is never used.
+    '''
+    if normalize_query(keywords):
+        return search_batch([(keywords, parse_codes(numbers), dept, division, k)])[0]
+    with PROFILER.trace('search'), METRICS.timer('search.lookup'):
+        ids = candidate_rows(parse_codes(numbers), dept, division)
+        return RESOURCES.courses if ids is None else RESOURCES.catalog.select(ids)
+
+def search_batch(requests: list) -> list:
+    '''
+    Rank several keyword searches given as (keywords, codes, dept, division, k) tuples. Ranked
+    results are cached per query and filter combination. Queries that need embeddings are encoded
+    in one batch, and queries sharing the same filters are ranked with one index search. In hybrid
+    mode the vector ranking is fused with the BM25 ranking; lexical queries never use the model.
+    '''
+    with PROFILER.trace('search'), METRICS.timer('search.batch'):
+        return _search_batch(requests)
+
+def _search_batch(requests: list) -> list:
+    keys = [
+        (normalize_query(keywords), codes, dept.strip().upper(), division, k)
+        for keywords, codes, dept, division, k in requests
+    ]
+    results = [RESULT_CACHE.get(key) for key in keys]
+    pending = [i for i, result in enumerate(results) if result is None]
+    METRICS.inc('search.queries', len(keys))
+    METRICS.inc('search.cached', len(keys) - len(pending))
+    if not pending:
+        return results
+
+    semantic = {i: row for row, i in enumerate(i for i in pending if not is_lexical(keys[i][0]))}
+    embeddings = encode_queries([keys[i][0] for i in semantic]) if semantic else None
+    groups = {}
+    for i in pending:
+        groups.setdefault(keys[i][1:], []).append(i)
+    courses = RESOURCES.courses
+    for (codes, dept, division, k), members in groups.items():
+        ids = candidate_rows(codes, dept, division)
+        encoded = [i for i in members if i in semantic]
+        vector_rows = dict(zip(encoded, search_rows(embeddings[[semantic[i] for i in encoded]], k, ids))
+                           if encoded else ())
+        for i in members:
+            query = keys[i][0]
+            if i not in vector_rows:
+                with METRICS.timer('search.lexical'):
+                    rows = RESOURCES.lexical.search(query.strip('"'), k, ids)
+            elif SEARCH_MODE == 'hybrid':
+                with METRICS.timer('search.lexical'):
+                    lexical_rows = RESOURCES.lexical.search(query, k, ids)
+                rows = fuse([vector_rows[i], lexical_rows], k)
+            else:
+                rows = vector_rows[i]
+            results[i] = [courses[row] for row in rows]
+            RESULT_CACHE.put(keys[i], results[i])
+    return results
@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .search import search, search_batch, parse_codes, normalize_query
+from ..const import SEARCH_TOP_K
+
+class SearchService:
+    '''
+    Runs searches on a dedicated worker thread so that model encoding and FAISS searches never
+    block the bot's event loop. Keyword searches arriving within batch_window seconds of each other
+    are handed to the worker together, encoded as one batch and ranked with one index search per
+    distinct filter combination, then fanned back out to the awaiting commands.
+    '''
+    def __init__(self, batch_window: float = 0.005, max_batch: int = 32):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search')
+        self.pending = []
+        self.flush_handle = None
+
+    async def search(
+        self,
+        numbers: str = '',
+        keywords: str = '',
+        dept: str = '',
+        division: str = 'All Courses',
+        k: int = SEARCH_TOP_K
+    ) -> list:
+        loop = asyncio.get_running_loop()
+        if not normalize_query(keywords):
+            return await loop.run_in_executor(self.executor, search, numbers, keywords, dept, division, k)
+
+        future = loop.create_future()
+        self.pending.append(((keywords, parse_codes(numbers), dept, division, k), future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        requests = [request for request, _ in batch]
+        futures = [future for _, future in batch]
+        task = asyncio.get_running_loop().run_in_executor(self.executor, search_batch, requests)
+        task.add_done_callback(lambda done: self._fan_out(done, futures))
+
+    @staticmethod
+    def _fan_out(done: asyncio.Future, futures: list) -> None:
+        if done.cancelled() or done.exception() is not None:
+            for future in futures:
+                if future.done():
+                    continue
+                if done.cancelled():
+                    future.cancel()
+                else:
+                    future.set_exception(done.exception())
+            return
+        for future, result in zip(futures, done.result()):
+            if not future.done():
+                future.set_result(result)
+
+SEARCH_SERVICE = SearchService()
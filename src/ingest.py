@@ -0,0 +1,183 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+
+from .audit import process_upload, save_failed_audit
+from .const import AUDIT_PARSER, AUDIT_QUEUE_SIZE, AUDIT_WORKERS
+from .db import insert_or_update_users
+from .metrics import METRICS
+from .notify import notify_audit
+from .utils import LRUCache
+
+class AuditIngestor:
+    '''
+    Background ingestion of audit uploads. Uploads wait in a bounded queue, are sanitised and
+    parsed in a pool of worker processes, and the parsed audits are written to the database in
+    batched transactions. Job progress can be looked up by job id, or by PID once the audit has
+    been parsed. Job ids are random and handed only to the uploader, while PID lookups say whether
+    the PID is linked to an account, so the two are kept apart.
+    '''
+    def __init__(
+        self,
+        parser: str = AUDIT_PARSER,
+        workers: int = AUDIT_WORKERS,
+        queue_size: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = 32,
+        batch_wait: float = 0.05
+    ):
+        self.parser = parser
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue()
+        self.jobs = LRUCache(maxsize=4 * queue_size + 1024, ttl=60 * 60)
+        self.pids = LRUCache(maxsize=4 * queue_size + 1024, ttl=60 * 60)
+        # at most two audits per worker are handed to the pool, the rest wait in the queue
+        self.slots = threading.Semaphore(2 * workers)
+        self.pool = None
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.pool is not None:
+                return
+            self.pool = self._make_pool()
+            threading.Thread(target=self._dispatch, name='audit-dispatch', daemon=True).start()
+            threading.Thread(target=self._write, name='audit-write', daemon=True).start()
+
+    def _make_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, html: str, upload_hash: str | None = None) -> str | None:
+        '''
+        Queue an audit upload, returning its job id, or None if the queue is full.
+        '''
+        self.start()
+        job = uuid.uuid4().hex
+        self.jobs.put(job, {'status': 'queued'})
+        with self._idle:
+            self.pending += 1
+        try:
+            self.queue.put_nowait((job, html, upload_hash))
+        except queue.Full:
+            self.jobs.pop(job)
+            self._done(1)
+            return None
+        return job
+
+    def stop(self, timeout: float = 30) -> bool:
+        '''
+        Wait up to timeout seconds for queued audits to be stored, then shut the worker pool down.
+        Returns whether every queued audit was stored.
+        '''
+        if self.pool is None:
+            return True
+        with self._idle:
+            drained = self._idle.wait_for(lambda: self.pending == 0, timeout)
+        if not drained:
+            print(f"[Ingest] Stopping with {self.pending} audits not stored")
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        return drained
+
+    def _done(self, count: int) -> None:
+        with self._idle:
+            self.pending -= count
+            if self.pending == 0:
+                self._idle.notify_all()
+
+    def status(self, job: str) -> dict | None:
+        return self.jobs.get(job)
+
+    def pid_status(self, pid: str) -> dict | None:
+        return self.pids.get(pid)
+
+    def _dispatch(self) -> None:
+        while True:
+            job, html, upload_hash = self.queue.get()
+            self.slots.acquire()
+            start = time.perf_counter()
+            self.jobs.put(job, {'status': 'processing'})
+            try:
+                future = self._submit(html)
+            except Exception as e:
+                # e.g. the pool was shut down by stop(), or a new one could not be started
+                print(f"[Ingest] Failed to hand an audit to the workers: {e}")
+                METRICS.inc('audit.errors')
+                self.jobs.put(job, {'status': 'error'})
+                self.slots.release()
+                self._done(1)
+                continue
+            future.add_done_callback(
+                lambda future, job=job, upload_hash=upload_hash, start=start: self._parsed(job, upload_hash, start, future)
+            )
+
+    def _submit(self, html: str):
+        try:
+            return self.pool.submit(process_upload, html, self.parser)
+        except BrokenProcessPool:
+            print("[Ingest] Worker pool broke, starting a new one")
+            self.pool = self._make_pool()
+            return self.pool.submit(process_upload, html, self.parser)
+
+    def _parsed(self, job, upload_hash, start, future) -> None:
+        # sanitising and parsing happen in the workers, so they are timed together from here
+        METRICS.observe('audit.ingest.process', time.perf_counter() - start)
+        self.slots.release()
+        self.results.put((job, upload_hash, future))
+
+    def _write(self) -> None:
+        while True:
+            batch = [self.results.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size and (timeout := deadline - time.monotonic()) > 0:
+                try:
+                    batch.append(self.results.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"[Ingest] Failed to write {len(batch)} audits: {e}")
+                for job, _, _ in batch:
+                    self.jobs.put(job, {'status': 'error'})
+            finally:
+                self._done(len(batch))
+
+    def _write_batch(self, batch: list) -> None:
+        audits = []
+        for job, upload_hash, future in batch:
+            if future.exception() is not None:
+                print(f"[Ingest] Failed to process audit: {future.exception()}")
+                METRICS.inc('audit.errors')
+                self.jobs.put(job, {'status': 'error'})
+                continue
+            audit, failed_html = future.result()
+            if failed_html is not None:
+                METRICS.inc('audit.failed')
+                save_failed_audit(failed_html)
+            if audit is None or audit == -1:
+                METRICS.inc('audit.invalid')
+                self.jobs.put(job, {'status': 'invalid'})
+                continue
+            audits.append((job, audit, upload_hash))
+
+        if not audits:
+            return
+        with METRICS.timer('audit.write'):
+            stored = insert_or_update_users(
+                [(audit['pid'], audit, upload_hash) for _, audit, upload_hash in audits]
+            )
+        METRICS.inc('audit.stored', len(audits))
+        for (job, audit, _), user in zip(audits, stored):
+            status = {'status': 'done', 'pid': audit['pid'], 'linked': user is not None}
+            self.jobs.put(job, status)
+            self.pids.put(audit['pid'], status)
+            if user:
+                notify_audit(*user)
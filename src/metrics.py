@@ -0,0 +1,241 @@
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import os
+import sys
+import threading
+from time import perf_counter
+from typing import Callable
+
+# latency bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+PROFILES_DIR = 'data/profiles'
+
+class Histogram:
+    '''
+    Fixed-bucket latency histogram: recording is a bisect and a few additions, and memory does not
+    grow with the number of observations. Percentiles are estimated as bucket upper bounds.
+    '''
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_s': self.sum,
+            'mean_ms': 1000 * self.sum / self.count if self.count else 0.0,
+            'p50_ms': 1000 * self.percentile(0.5),
+            'p95_ms': 1000 * self.percentile(0.95),
+            'p99_ms': 1000 * self.percentile(0.99),
+            'max_ms': 1000 * self.max
+        }
+
+class Metrics:
+    '''
+    Process-wide counters, latency histograms and gauges. Gauges are callables evaluated when a
+    snapshot is taken, for values that are already tracked elsewhere such as cache statistics.
+    '''
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.gauges = {}
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    def gauge(self, name: str, func: Callable[[], float | dict]) -> None:
+        self.gauges[name] = func
+
+    @contextmanager
+    def timer(self, name: str):
+        '''
+        Time a block into the named histogram. Failures are timed too and counted as name.errors.
+        '''
+        start = perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc(f'{name}.errors')
+            raise
+        finally:
+            self.observe(name, perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {
+                'pid': os.getpid(),
+                'started': self.started.isoformat(timespec='seconds'),
+                'counters': dict(self.counters),
+                'histograms': {name: h.snapshot() for name, h in sorted(self.histograms.items())}
+            }
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = f'error: {e}'
+        snapshot['gauges'] = gauges
+        snapshot['profiler'] = PROFILER.status()
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        '''
+        The counters, histograms and numeric gauges in the Prometheus text format.
+        '''
+        def metric(name):
+            return 'tritonthink_' + ''.join(c if c.isalnum() else '_' for c in name)
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f'# TYPE {metric(name)}_total counter', f'{metric(name)}_total {value}']
+            for name, h in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {metric(name)}_seconds histogram')
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric(name)}_seconds_bucket{{le="{le}"}} {cumulative}')
+                lines += [f'{metric(name)}_seconds_sum {h.sum}', f'{metric(name)}_seconds_count {h.count}']
+        for name, func in sorted(self.gauges.items()):
+            try:
+                value = func()
+            except Exception:
+                continue
+            values = value.items() if isinstance(value, dict) else [('', value)]
+            for key, v in values:
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    gauge = metric(f'{name}.{key}' if key else name)
+                    lines += [f'# TYPE {gauge} gauge', f'{gauge} {v}']
+        return '\n'.join(lines) + '\n'
+
+class SamplingProfiler:
+    '''
+    Statistical profiler for slow requests. While enabled, a background thread samples the stacks
+    of threads inside a traced request every interval seconds; when a request takes longer than
+    threshold seconds its samples are written to PROFILES_DIR as folded stacks, the input format of
+    flamegraph.pl and speedscope. When disabled, tracing a request costs one attribute check.
+    '''
+    MAX_SAMPLES = 10000
+
+    def __init__(self):
+        self.enabled = False
+        self.interval = 0.005
+        self.threshold = 0.5
+        self.active = {}
+        self.captured = 0
+        self._lock = threading.Lock()
+        self._control = threading.Lock()
+        self._thread = None
+        self._stopped = None
+
+    def start(self, threshold: float | None = None, interval: float | None = None) -> None:
+        if threshold is not None:
+            self.threshold = threshold
+        if interval is not None:
+            self.interval = interval
+        with self._control:
+            self.enabled = True
+            if self._thread is None:
+                # each sampler thread has its own stop event, so a stopped thread never resumes
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._sample, args=(self._stopped,), name='sampling-profiler', daemon=True
+                )
+                self._thread.start()
+        print(f"[Profiler] Capturing requests slower than {self.threshold * 1000:.0f}ms")
+
+    def stop(self) -> None:
+        with self._control:
+            self.enabled = False
+            if self._thread is not None:
+                self._stopped.set()
+                self._thread.join()
+                self._thread = None
+        print("[Profiler] Stopped")
+
+    def status(self) -> dict:
+        return {'enabled': self.enabled, 'threshold_ms': self.threshold * 1000,
+                'interval_ms': self.interval * 1000, 'captured': self.captured}
+
+    def _sample(self, stopped: threading.Event):
+        while not stopped.wait(self.interval):
+            with self._lock:
+                if not self.active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and len(samples) < self.MAX_SAMPLES:
+                        samples.append(_fold(frame))
+
+    @contextmanager
+    def trace(self, name: str):
+        '''
+        Mark the current thread as serving a request for the duration of the block. Nested traces
+        belong to the outermost one.
+        '''
+        thread_id = threading.get_ident()
+        if not self.enabled or thread_id in self.active:
+            yield
+            return
+        with self._lock:
+            self.active[thread_id] = []
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            with self._lock:
+                samples = self.active.pop(thread_id, [])
+            if elapsed >= self.threshold and samples:
+                self._write(name, elapsed, samples)
+
+    def _write(self, name: str, elapsed: float, samples: list) -> None:
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = f"{PROFILES_DIR}/{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{elapsed * 1000:.0f}ms.folded"
+        with open(path, 'w') as f:
+            for stack, count in Counter(samples).most_common():
+                f.write(f'{stack} {count}\n')
+        self.captured += 1
+        print(f"[Profiler] {name} took {elapsed * 1000:.0f}ms, {len(samples)} samples written to {path}")
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+METRICS = Metrics()
+PROFILER = SamplingProfiler()
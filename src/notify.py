@@ -0,0 +1,41 @@
+import asyncio
+import socket
+
+from .const import NOTIFY_ADDR
+
+_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+def notify_audit(discord_user_id: str, version: str = None) -> None:
+    '''
+    Tell the bot that an audit was stored for a user, along with the stored audit version. This is
+    a best-effort local datagram: if the bot is not listening it is dropped, and the bot's fallback
+    check picks the change up.
+    '''
+    payload = f'{discord_user_id} {version}' if version else str(discord_user_id)
+    try:
+        _socket.sendto(payload.encode(), NOTIFY_ADDR)
+    except OSError as e:
+        print(f"[Notify] Failed to notify bot: {e}")
+
+class _NotificationProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        discord_user_id, _, version = data.decode(errors='ignore').partition(' ')
+        self.callback(discord_user_id, version or None)
+
+_transport = None
+
+async def listen(callback) -> None:
+    '''
+    Call callback(discord_user_id, version) on the event loop whenever the audit server stores an
+    audit. The version is None if the sender did not include one.
+    '''
+    global _transport
+    if _transport is not None:
+        return
+    _transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: _NotificationProtocol(callback), local_addr=NOTIFY_ADDR
+    )
+    print(f"[Notify] Listening for audit notifications on {NOTIFY_ADDR[0]}:{NOTIFY_ADDR[1]}")
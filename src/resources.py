@@ -0,0 +1,100 @@
+from threading import Lock, Thread
+from time import perf_counter
+from typing import Any, Callable
+
+from .const import SEARCH_FILTERS
+from .courses.catalog import Catalog, load_snapshot
+from .courses.index import RowMap, course_ids, index_digest, load_index, load_index_meta
+from .courses.lexical import LexicalIndex, load_lexical_index
+from .courses.model import load_model, model_tag
+from .courses.prereqs import PrereqGraph, load_prereq_graph
+
+class Resources:
+    '''
+    Registry for the heavy resources used by search: the embedding model, the course list, the
+    columnar catalog, the FAISS index and its row mapping, the BM25 index and the prerequisite
+    graph. Nothing is loaded until first use, each resource is loaded at most once even under
+    concurrent access, and load times are logged per resource.
+    '''
+    def __init__(self):
+        self._loaders: dict[str, Callable[[], Any]] = {
+            'model': load_model,
+            'courses': load_snapshot,
+            'catalog': lambda: Catalog(self.courses, SEARCH_FILTERS),
+            'index': lambda: load_index(self.index_meta),
+            'index_meta': lambda: load_index_meta(index_digest(self.courses), model_tag()),
+            'index_rows': lambda: RowMap(course_ids(self.courses)),
+            'lexical': lambda: load_lexical_index(self.courses),
+            'prereqs': lambda: load_prereq_graph(self.courses)
+        }
+        self._values = {}
+        self._locks = {name: Lock() for name in self._loaders}
+
+    def get(self, name: str) -> Any:
+        if name in self._values:
+            return self._values[name]
+        with self._locks[name]:
+            if name not in self._values:
+                start = perf_counter()
+                self._values[name] = self._loaders[name]()
+                print(f'[Initialization] Loaded {name} in {perf_counter() - start:.2f}s')
+        return self._values[name]
+
+    def set(self, name: str, value: Any) -> None:
+        with self._locks[name]:
+            self._values[name] = value
+
+    def reload(self, *names: str) -> None:
+        '''
+        Drop the given resources so that they are loaded again on next use.
+        '''
+        for name in names:
+            with self._locks[name]:
+                self._values.pop(name, None)
+
+    def warm(self, *names: str) -> Thread:
+        '''
+        Load resources in a background thread so the first command does not pay for them.
+        '''
+        def load():
+            start = perf_counter()
+            for name in names or self._loaders:
+                self.get(name)
+            print(f'[Initialization] Warmed resources in {perf_counter() - start:.2f}s')
+        thread = Thread(target=load, name='warm-resources', daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def model(self):
+        return self.get('model')
+
+    @property
+    def courses(self) -> list:
+        return self.get('courses')
+
+    @property
+    def catalog(self) -> Catalog:
+        return self.get('catalog')
+
+    @property
+    def index(self):
+        return self.get('index')
+
+    @property
+    def index_meta(self) -> dict:
+        return self.get('index_meta')
+
+    @property
+    def index_rows(self) -> RowMap:
+        return self.get('index_rows')
+
+    @property
+    def lexical(self) -> LexicalIndex:
+        return self.get('lexical')
+
+    @property
+    def prereqs(self) -> PrereqGraph:
+        return self.get('prereqs')
+
+RESOURCES = Resources()
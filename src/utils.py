@@ -1,5 +1,8 @@
 import json
-from typing import Any
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable
 
 def read_json(filename: str) -> dict | list:
     with open(filename, 'r') as f:
@@ -7,4 +10,67 @@ def read_json(filename: str) -> dict | list:
 
 def write_json(filename: str, data: Any) -> None:
     with open(filename, 'w') as f:
-        json.dump(data, f)
\ No newline at end of file
+        json.dump(data, f)
+
+class LRUCache:
+    '''
+    Thread-safe least-recently-used cache with an optional time-to-live and hit/miss counters.
+    '''
+    def __init__(self, maxsize: int = 256, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> list:
+        '''
+        The cached (key, value) pairs, without counting as lookups.
+        '''
+        with self._lock:
+            return [(key, entry[1]) for key, entry in self._data.items()]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,37 @@
+'''
+The src modules read the bot configuration from data/config relative to the working directory
+when they are imported, so the tests run from a scratch directory holding a minimal configuration.
+'''
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='tritonthink-tests-')
+for path, data in {
+    'data/config/bot.json': {'token': 'test'},
+    'data/config/year.json': {'year': 25},
+    'data/enrollment_calendar/25.json': {}
+}.items():
+    os.makedirs(os.path.join(_workdir, os.path.dirname(path)), exist_ok=True)
+    with open(os.path.join(_workdir, path), 'w') as f:
+        json.dump(data, f)
+os.chdir(_workdir)
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    '''
+    A fresh database for one test, instead of the scratch directory's shared one.
+    '''
+    from src import db
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'users.db'))
+    db.close()
+    db.init_db()
+    yield
+    db.close()
@@ -0,0 +1,76 @@
+'''
+The users and audit tables, each test against its own scratch database.
+'''
+import json
+import random
+
+from benchmarks.synthetic import synthetic_audit
+from src import db
+from src.audit import process_audit_lxml
+
+def audit(pid: str, seed: int = 0) -> dict:
+    return process_audit_lxml(synthetic_audit(random.Random(seed), pid))
+
+def test_audit_versions(database):
+    db.link_or_update_pid('1', 'A11111111')
+    db.link_or_update_pid('2', 'A22222222')
+    (_, version), = db.insert_or_update_users([('A11111111', audit('A11111111'), None)])
+    assert db.get_audit_versions(['1', '2', '3']) == {'1': version, '2': None}
+    assert db.get_audit_with_version('1')[1] == version
+
+def test_new_pid_is_unverified(database):
+    db.link_or_update_pid('7', 'A11111111')
+    (_, version), = db.insert_or_update_users([('A11111111', audit('A11111111'), 'upload')])
+    # linking the same PID again keeps its audit
+    db.link_or_update_pid('7', 'A11111111')
+    assert db.get_verified_users(['7']) == {'7'}
+    assert db.get_audit_with_version('7')[1] == version
+
+    db.link_or_update_pid('7', 'A22222222')
+    assert db.get_verified_users(['7']) == set()
+    assert db.get_audit_with_version('7') == (None, None)
+    assert db.find_audit('upload') is None
+    assert db.connect().execute(
+        "SELECT earned_units, wip_units FROM users WHERE discord_user_id = '7'"
+    ).fetchone() == (None, None)
+
+def test_legacy_audits_are_migrated(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'users.db'))
+    db.close()
+    # the users table before the audit tables, with audits stored as JSON
+    with db.connect() as conn:
+        conn.execute('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pid TEXT UNIQUE NOT NULL,
+            discord_user_id TEXT UNIQUE NOT NULL,
+            verified BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            json_data TEXT
+        )
+        ''')
+        audits = {str(i): audit(f'A0000000{i}', i) for i in range(1, 4)}
+        rows = [(f'A0000000{i}', i, json.dumps(audits[i])) for i in audits]
+        rows += [('A00000004', '4', 'null'), ('A00000005', '5', '{"major": '),
+                 ('A00000006', '6', json.dumps({'major': {'title': 'Untitled'}})), ('A00000007', '7', None)]
+        conn.executemany('INSERT INTO users (pid, discord_user_id, verified, json_data) VALUES (?, ?, 1, ?)', rows)
+    try:
+        db.init_db()
+        assert 'Migrated 3 of 6 audits' in capsys.readouterr().out
+        for discord_user_id, expected in audits.items():
+            assert db.get_audit_with_version(discord_user_id)[0] == expected
+        # audits that could not be moved are kept where they were, without a partial copy
+        left = dict(db.connect().execute('SELECT discord_user_id, json_data FROM users WHERE json_data IS NOT NULL'))
+        assert left == {'4': 'null', '5': '{"major": ', '6': rows[5][2]}
+        assert db.get_audit_with_version('6') == (None, None)
+        assert db.connect().execute('SELECT COUNT(*) FROM majors').fetchone()[0] == sum(
+            ('major' in a) + ('second_major' in a) for a in audits.values()
+        )
+        legacy = dict(db.connect().execute('SELECT user_id, json_data FROM legacy_audits'))
+        assert sorted(json.loads(data)['pid'] for data in legacy.values()) == sorted(a['pid'] for a in audits.values())
+        # only the skipped audits are tried again
+        db.init_db()
+        assert 'Migrated 0 of 3 audits' in capsys.readouterr().out
+        assert db.get_audit_with_version('1')[0] == audits['1']
+    finally:
+        db.close()
@@ -0,0 +1,19 @@
+'''
+/next's answer for users without an audit, and for audits that list no courses.
+'''
+from src import db
+from src.functions.eligibility import next_courses
+
+def test_users_without_a_verified_audit(database):
+    assert next_courses('1') is None
+    db.link_or_update_pid('1', 'A11111111')
+    assert next_courses('1') is None
+
+def test_audit_without_courses(database):
+    db.link_or_update_pid('1', 'A11111111')
+    audit = {'pid': 'A11111111', 'earned_units': 180.0, 'wip_units': 0, 'major': {
+        'title': 'Computer Science', 'categories': [{'major_category': 'Core', 'subreqs': []}]
+    }}
+    db.insert_or_update_user('A11111111', audit)
+    assert db.get_course_progress(['1']) == {}
+    assert next_courses('1') == []
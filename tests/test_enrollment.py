@@ -0,0 +1,53 @@
+'''
+Lookups in the enrollment schedule with overlapping windows.
+'''
+from datetime import datetime
+
+import pytest
+
+from src.functions.enrollment import EnrollmentSchedule
+
+@pytest.fixture
+def schedule():
+    return EnrollmentSchedule({
+        'FA25': {
+            # a long window that the shorter ones below start and end inside
+            'fp4': (datetime(2025, 5, 1, 8), datetime(2025, 5, 20, 23)),
+            'fp3': (datetime(2025, 5, 2, 8), datetime(2025, 5, 3, 23)),
+            'fp2': (datetime(2025, 5, 3, 8), datetime(2025, 5, 4, 23)),
+            'sp4': (datetime(2025, 5, 10, 8), datetime(2025, 5, 11, 23)),
+        },
+        'WI26': {
+            'fp4': (datetime(2025, 5, 3, 8), datetime(2025, 5, 3, 12)),
+        }
+    })
+
+def opened(windows: list) -> list:
+    return [(window['quarter'], window['pass']) for window in windows]
+
+@pytest.mark.parametrize('when, expected', [
+    (datetime(2025, 4, 30), []),
+    (datetime(2025, 5, 1, 8), [('FA25', 'fp4')]),
+    (datetime(2025, 5, 3, 9), [('FA25', 'fp4'), ('FA25', 'fp3'), ('WI26', 'fp4'), ('FA25', 'fp2')]),
+    (datetime(2025, 5, 3, 12), [('FA25', 'fp4'), ('FA25', 'fp3'), ('FA25', 'fp2')]),
+    (datetime(2025, 5, 7), [('FA25', 'fp4')]),
+    (datetime(2025, 5, 10, 12), [('FA25', 'fp4'), ('FA25', 'sp4')]),
+    (datetime(2025, 5, 20, 23), []),
+], ids=['before', 'at-start', 'all-overlap', 'at-end', 'long-only', 'later', 'after'])
+def test_open_at(schedule, when, expected):
+    assert opened(schedule.open_at(when)) == expected
+
+def test_next_after(schedule):
+    # windows starting together are in end order
+    assert opened(schedule.next_after(datetime(2025, 5, 2, 12), count=2)) == [('WI26', 'fp4'), ('FA25', 'fp2')]
+    # a window starting at the time itself has already opened
+    assert opened(schedule.next_after(datetime(2025, 5, 10, 8), count=5)) == []
+    assert opened(schedule.next_after(datetime(2025, 4, 1))) == [('FA25', 'fp4')]
+    window = schedule.next_after(datetime(2025, 5, 9))[0]
+    assert window['name'] == 'Second Pass (seniors)'
+    assert (window['start'], window['end']) == (datetime(2025, 5, 10, 8), datetime(2025, 5, 11, 23))
+
+def test_empty_schedule():
+    schedule = EnrollmentSchedule({})
+    assert schedule.open_at(datetime(2025, 5, 1)) == []
+    assert schedule.next_after(datetime(2025, 5, 1)) == []
@@ -0,0 +1,100 @@
+'''
+Stable course ids of the FAISS index, with random vectors standing in for description embeddings.
+'''
+import numpy as np
+import pytest
+
+from src.courses import index as index_module
+from src.courses.embed import _search_rows
+from src.courses.index import (ID_SCHEME, RowMap, build_index, course_ids, index_digest, load_index,
+                               load_index_meta, save_index)
+
+def catalog(count: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    courses = [{'code': f'CSE {i}', 'desc': f'Course {i}'} for i in range(count)]
+    vectors = {course['code']: rng.normal(size=16).astype(np.float32) for course in courses}
+    return courses, vectors
+
+def build(courses: list, vectors: dict, backend: str = 'flat') -> tuple:
+    ids, rows = np.unique(course_ids(courses), return_index=True)
+    index, meta = build_index(np.stack([vectors[courses[row]['code']] for row in rows]), ids, backend)
+    return index, meta, RowMap(course_ids(courses))
+
+def test_ids_survive_catalog_changes():
+    courses, _ = catalog(50)
+    ids = dict(zip((course['code'] for course in courses), course_ids(courses).tolist()))
+    changed = [{'code': 'AAA 1', 'desc': 'New course'}] + courses[:10] + courses[11:]
+    assert all(ids[course['code']] == i for course, i in zip(changed[1:], course_ids(changed)[1:].tolist()))
+    # spacing and case of the code do not matter, and ids are non-negative int64
+    assert course_ids([{'code': 'cse  3'}])[0] == ids['CSE 3']
+    assert (course_ids(courses) >= 0).all()
+
+def test_row_map_round_trip():
+    courses, _ = catalog(20)
+    courses.append(dict(courses[3]))
+    row_map = RowMap(course_ids(courses))
+    assert len(row_map.to_ids([3, 20])) == 1
+    assert row_map.to_rows(row_map.to_ids([3, 20])).tolist() == [3]
+    assert row_map.to_rows([-1, 12345]).tolist() == [-1, -1]
+
+@pytest.mark.parametrize('backend', ['flat', 'flat_ip', 'hnsw'])
+def test_search_returns_current_rows(backend):
+    courses, vectors = catalog(200)
+    index, meta, _ = build(courses, vectors, backend)
+    # rows shift after the index was built: a course is inserted at the front and one removed
+    current = [{'code': 'AAA 1', 'desc': 'New course'}] + courses[:50] + courses[51:]
+    row_map = RowMap(course_ids(current))
+    query = vectors['CSE 120'][None]
+
+    found = _search_rows(index, meta, row_map, query, 5, None)[0]
+    assert current[found[0]]['code'] == 'CSE 120'
+    assert all(current[row]['code'] != 'CSE 50' for row in found)
+
+    allowed = [row for row, course in enumerate(current) if course['code'] in ('CSE 120', 'CSE 7', 'AAA 1')]
+    restricted = _search_rows(index, meta, row_map, query, 5, allowed)[0]
+    # the new course has no vector yet, so only the two indexed courses can be found
+    assert sorted(current[row]['code'] for row in restricted) == ['CSE 120', 'CSE 7']
+
+def test_digest_ignores_row_order():
+    courses, _ = catalog(10)
+    assert index_digest(courses) == index_digest(courses[::-1])
+    assert index_digest(courses) != index_digest(courses[:-1])
+
+@pytest.fixture
+def saved_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_module, 'INDEX_PATH', str(tmp_path / 'catalog.faiss'))
+    monkeypatch.setattr(index_module, 'INDEX_META_PATH', str(tmp_path / 'catalog.faiss.json'))
+    courses, vectors = catalog(30)
+    index, meta, _ = build(courses, vectors)
+    meta.update({'model': 'all-MiniLM-L6-v2', 'ids': ID_SCHEME, 'catalog': index_digest(courses)})
+    save_index(index, meta)
+    return courses, meta
+
+def test_index_loads_when_it_matches(saved_index, capsys):
+    courses, _ = saved_index
+    meta = load_index_meta(index_digest(courses), 'all-MiniLM-L6-v2')
+    assert load_index(meta).ntotal == 30
+    assert capsys.readouterr().out == ''
+
+def test_index_from_another_model_is_rejected(saved_index):
+    courses, _ = saved_index
+    with pytest.raises(ValueError, match='built with all-MiniLM-L6-v2'):
+        load_index_meta(index_digest(courses), 'all-mpnet-base-v2')
+
+def test_index_from_another_backend_or_catalog_warns(saved_index, capsys):
+    courses, _ = saved_index
+    load_index_meta(index_digest(courses[:-1]), 'all-MiniLM-L6-v2:onnx_int8')
+    out = capsys.readouterr().out
+    assert 'queries use all-MiniLM-L6-v2:onnx_int8' in out
+    assert 'different catalog' in out
+
+def test_index_with_mismatched_metadata_is_rejected(saved_index):
+    _, meta = saved_index
+    with pytest.raises(ValueError, match='holds 30 vectors'):
+        load_index(dict(meta, count=31))
+
+def test_index_with_row_ids_is_rejected(saved_index):
+    _, meta = saved_index
+    index_module.write_json(index_module.INDEX_META_PATH, {k: v for k, v in meta.items() if k != 'ids'})
+    with pytest.raises(ValueError, match='stable course ids'):
+        load_index_meta()
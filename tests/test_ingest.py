@@ -0,0 +1,41 @@
+'''
+The background audit ingestor when audits cannot be handed to its worker pool.
+'''
+from concurrent.futures.process import BrokenProcessPool
+
+from src.ingest import AuditIngestor
+
+def test_jobs_that_cannot_be_submitted_fail_and_drain():
+    ingestor = AuditIngestor(workers=1, queue_size=4)
+    ingestor.start()
+    # the pool is shut down, so submitting to it raises
+    assert ingestor.stop(timeout=1)
+    jobs = [ingestor.submit('<html></html>') for _ in range(3)]
+    with ingestor._idle:
+        assert ingestor._idle.wait_for(lambda: ingestor.pending == 0, 5)
+    assert [ingestor.status(job) for job in jobs] == [{'status': 'error'}] * 3
+    # the dispatcher is still running and gave back its slots
+    job = ingestor.submit('<html></html>')
+    with ingestor._idle:
+        assert ingestor._idle.wait_for(lambda: ingestor.pending == 0, 5)
+    assert ingestor.status(job) == {'status': 'error'}
+    assert ingestor.slots._value == 2
+
+def test_pool_that_cannot_be_replaced(monkeypatch):
+    ingestor = AuditIngestor(workers=1, queue_size=4)
+    ingestor.start()
+    ingestor.pool.shutdown()
+
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool()
+
+    def make_pool():
+        raise OSError('no more processes')
+
+    ingestor.pool = BrokenPool()
+    monkeypatch.setattr(ingestor, '_make_pool', make_pool)
+    job = ingestor.submit('<html></html>')
+    with ingestor._idle:
+        assert ingestor._idle.wait_for(lambda: ingestor.pending == 0, 5)
+    assert ingestor.status(job) == {'status': 'error'}
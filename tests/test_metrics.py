@@ -0,0 +1,30 @@
+'''
+The sampling profiler's background thread across restarts.
+'''
+import threading
+
+from src.metrics import SamplingProfiler
+
+def samplers() -> list:
+    return [thread for thread in threading.enumerate() if thread.name == 'sampling-profiler']
+
+def test_restart_replaces_the_sampler():
+    profiler = SamplingProfiler()
+    profiler.start(interval=1)
+    first = profiler._thread
+    # the first sampler is still waiting out its interval when the profiler is started again
+    profiler.stop()
+    assert not first.is_alive()
+    profiler.start()
+    try:
+        assert profiler._thread is not first
+        assert samplers() == [profiler._thread]
+    finally:
+        profiler.stop()
+    assert samplers() == []
+    assert not profiler.enabled
+
+def test_stop_without_start():
+    profiler = SamplingProfiler()
+    profiler.stop()
+    assert profiler._thread is None
@@ -0,0 +1,29 @@
+'''
+Prerequisite text from the catalog parsed into clauses of course codes.
+'''
+import pytest
+
+from src.courses.prereqs import parse_prereqs
+
+@pytest.mark.parametrize('text, expected', [
+    ('CSE 11 or CSE 8B.', [('CSE11', 'CSE8B')]),
+    ('CSE 12, CSE 15L, and CSE 21 or MATH 154.', [('CSE12',), ('CSE15L',), ('CSE21', 'MATH154')]),
+    ('MATH 20A or 20B; MATH 18.', [('MATH20A', 'MATH20B'), ('MATH18',)]),
+    ('None', []),
+], ids=['or', 'list', 'bare-number', 'none'])
+def test_course_requirements(text, expected):
+    assert parse_prereqs(text) == expected
+
+@pytest.mark.parametrize('text, expected', [
+    ('MATH 18 or concurrent enrollment.', [('MATH18',)]),
+    ('MATH 20C or concurrent enrollment in MATH 20C.', [('MATH20C',)]),
+    ('CSE 100 or graduate standing.', [('CSE100',)]),
+    ('CSE 12 and CSE 21; restricted to CS25, CS26, and CS27 majors.', [('CSE12',), ('CSE21',)]),
+    ('CSE 30, majors only.', [('CSE30',)]),
+    ('MATH 18; recommended: MATH 20C.', [('MATH18',)]),
+    ('CSE 8A. Students may not receive credit for CSE 8A and CSE 11.', [('CSE8A',)]),
+    ('Upper-division standing. Department approval required.', []),
+], ids=['concurrent', 'concurrent-course', 'standing', 'restricted', 'majors', 'recommended',
+        'credit', 'no-courses'])
+def test_codes_next_to_other_requirements_are_kept(text, expected):
+    assert parse_prereqs(text) == expected
@@ -0,0 +1,109 @@
+'''
+The catalog scraper against the saved department pages in fixtures/catalog, served by a local
+stand-in for catalog.ucsd.edu.
+'''
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from conftest import FIXTURES
+from src.courses.scrape import scrape_all
+
+class RecordingHandler(SimpleHTTPRequestHandler):
+    def log_request(self, code='-', size='-'):
+        self.server.requests.append((self.path, int(code), self.headers.get('If-Modified-Since')))
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def catalog(tmp_path):
+    site = tmp_path / 'site'
+    shutil.copytree(os.path.join(FIXTURES, 'catalog'), site)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(RecordingHandler, directory=str(site)))
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, site, tmp_path
+    server.shutdown()
+    server.server_close()
+
+def scrape(server, tmp_path):
+    server.requests.clear()
+    return scrape_all(
+        f'http://127.0.0.1:{server.server_port}/front/courses.html',
+        workers=2,
+        cache_path=str(tmp_path / 'scrape_cache.json'),
+        courses_dir=str(tmp_path / 'courses'),
+        rebuild=False
+    )
+
+def statuses(server) -> dict:
+    return {path: code for path, code, _ in server.requests}
+
+def test_first_scrape_parses_every_department(catalog):
+    server, _, tmp_path = catalog
+    assert scrape(server, tmp_path) == ['CSE', 'MATH']
+    # the repeated link is fetched once and the missing page is skipped
+    assert statuses(server) == {
+        '/front/courses.html': 200, '/courses/CSE.html': 200, '/courses/MATH.html': 200,
+        '/courses/GONE.html': 404
+    }
+    assert sorted(os.listdir(tmp_path / 'courses')) == ['CSE.json', 'MATH.json']
+
+    with open(tmp_path / 'courses' / 'CSE.json') as f:
+        cse = json.load(f)
+    assert [course['code'] for course in cse] == ['CSE 11', 'CSE 12', 'CSE 100', 'CSE 199']
+    assert cse[1] == {
+        'code': 'CSE 12',
+        'title': 'Basic Data Structures and Object-Oriented Design',
+        'units': '4',
+        'desc': 'Use and implementation of basic data structures. Prerequisites: CSE 11 or CSE 8B.',
+        'prereqs': 'CSE 11 or CSE 8B.'
+    }
+    assert cse[3]['title'] == 'Independent Study for Undergraduates'
+    assert cse[3]['units'] is None
+    assert cse[3]['prereqs'] == 'None'
+
+def test_unchanged_pages_are_not_downloaded_again(catalog):
+    server, _, tmp_path = catalog
+    scrape(server, tmp_path)
+    written = os.path.getmtime(tmp_path / 'courses' / 'CSE.json')
+
+    assert scrape(server, tmp_path) == []
+    department_requests = [request for request in server.requests if request[0].startswith('/courses/')]
+    assert all(since is not None for path, _, since in department_requests if path != '/courses/GONE.html')
+    assert statuses(server)['/courses/CSE.html'] == 304
+    assert statuses(server)['/courses/MATH.html'] == 304
+    assert os.path.getmtime(tmp_path / 'courses' / 'CSE.json') == written
+
+def test_only_changed_departments_are_rewritten(catalog):
+    server, site, tmp_path = catalog
+    scrape(server, tmp_path)
+
+    page = site / 'courses' / 'CSE.html'
+    page.write_text(page.read_text().replace('Advanced Data Structures', 'Advanced Data Structures and Algorithms'))
+    # Last-Modified has a resolution of one second
+    later = time.time() + 5
+    os.utime(page, (later, later))
+
+    assert scrape(server, tmp_path) == ['CSE']
+    assert statuses(server)['/courses/CSE.html'] == 200
+    assert statuses(server)['/courses/MATH.html'] == 304
+    with open(tmp_path / 'courses' / 'CSE.json') as f:
+        assert json.load(f)[2]['title'] == 'Advanced Data Structures and Algorithms'
+
+def test_pages_that_fail_to_load_keep_their_cached_courses(catalog):
+    server, site, tmp_path = catalog
+    scrape(server, tmp_path)
+    os.remove(site / 'courses' / 'MATH.html')
+
+    assert scrape(server, tmp_path) == []
+    assert statuses(server)['/courses/MATH.html'] == 404
+    with open(tmp_path / 'courses' / 'MATH.json') as f:
+        assert [course['code'] for course in json.load(f)] == ['MATH 18', 'MATH 20A']
@@ -0,0 +1,100 @@
+'''
+The audit server's upload, status and profiler routes through Flask's test client, against a scratch
+database.
+'''
+import pytest
+
+from benchmarks.synthetic import synthetic_corpus
+from server import app, ingestor
+from src.metrics import PROFILER
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.mark.parametrize('body', [
+    [{'html': '<html></html>'}],
+    'just a string',
+    {'html': 123},
+    {'html': ['<html></html>']},
+    {'html': {'nested': '<html></html>'}},
+    {'html': ''},
+    {},
+], ids=['list', 'string', 'number', 'html-list', 'html-object', 'empty-html', 'no-html'])
+def test_invalid_payloads_are_rejected(client, body):
+    response = client.post('/degree_audit_post', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_malformed_json_is_rejected(client):
+    response = client.post('/degree_audit_post', data='{"html": ', content_type='application/json')
+    assert response.status_code == 400
+
+def test_non_json_is_rejected(client):
+    response = client.post('/degree_audit_post', data='<html></html>', content_type='text/html')
+    assert response.status_code == 400
+
+def test_audits_are_accepted(client):
+    html = synthetic_corpus(1, 7)[0]
+    assert client.post('/degree_audit_post', json={'html': html}).status_code == 200
+
+def test_documents_that_are_not_audits_are_rejected(client):
+    response = client.post('/degree_audit_post', json={'html': '<html><body>hello</body></html>'})
+    assert response.status_code == 400
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 'secret')
+    yield 'secret'
+    PROFILER.stop()
+
+def test_profiler_is_off_without_a_token(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', None)
+    assert client.get('/profiler').status_code == 404
+    assert client.post('/profiler', json={'enabled': True}).status_code == 404
+    assert not PROFILER.enabled
+
+@pytest.mark.parametrize('headers', [
+    {}, {'Authorization': 'Bearer wrong'}, {'Authorization': 'secret'}, {'Authorization': 'Basic secret'}
+], ids=['none', 'wrong', 'no-scheme', 'basic'])
+def test_profiler_needs_the_token(client, admin_token, headers):
+    # requests from localhost are not trusted on their own, as everything is behind a proxy
+    assert client.get('/profiler', headers=headers, environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+    assert client.post('/profiler', json={'enabled': True}, headers=headers).status_code == 403
+    assert not PROFILER.enabled
+
+def test_profiler_with_the_token(client, admin_token):
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    response = client.post('/profiler', json={'enabled': True, 'threshold_ms': 250}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['enabled'] and response.get_json()['threshold_ms'] == 250
+    response = client.post('/profiler', json={'enabled': False}, headers=headers)
+    assert not response.get_json()['enabled']
+
+@pytest.fixture
+def statuses():
+    status = {'status': 'done', 'pid': 'A00000001', 'linked': False}
+    ingestor.jobs.put('0123abcd', status)
+    ingestor.pids.put('A00000001', status)
+    yield status
+    ingestor.jobs.pop('0123abcd')
+    ingestor.pids.pop('A00000001')
+
+def test_status_by_job_id_is_public(client, statuses):
+    response = client.get('/degree_audit_status/0123abcd')
+    assert response.status_code == 200
+    assert response.get_json() == statuses
+
+@pytest.mark.parametrize('token, headers, code', [
+    (None, {'Authorization': 'Bearer secret'}, 404),
+    ('secret', {}, 403),
+    ('secret', {'Authorization': 'Bearer wrong'}, 403),
+], ids=['no-token', 'no-header', 'wrong'])
+def test_status_by_pid_needs_the_token(client, statuses, monkeypatch, token, headers, code):
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', token)
+    assert client.get('/degree_audit_status/a00000001', headers=headers).status_code == code
+
+def test_status_by_pid_with_the_token(client, statuses, admin_token):
+    headers = {'Authorization': f'Bearer {admin_token}'}
+    assert client.get('/degree_audit_status/a00000001', headers=headers).get_json() == statuses
+    assert client.get('/degree_audit_status/A00000002', headers=headers).status_code == 404